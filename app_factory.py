@@ -0,0 +1,601 @@
+"""
+App Factory - one create_app() for every deployment of the Resume Screener API
+Endpoints are switched on by configuration, the Gemini SDK is imported lazily and the
+model pool is built by a background warm-up task, so importing the app and starting a
+worker is cheap. Import and startup timings are served from /startup-profile.
+"""
+
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import json
+import os
+import sys
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+# Load environment variables before the modules below read their settings
+load_dotenv()
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
+
+import gemini_client
+from candidate_store import CANDIDATE_STORE_ENABLED, CandidateStore
+from health import HealthProbe
+from job_queue import JobQueue
+from metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, STAGE_LATENCY, render_metrics
+from near_duplicates import NEAR_DUPLICATE_ENABLED, with_near_duplicates
+from prefilter import PREFILTER_TOP_K, PREFILTER_MIN_SCORE
+from rate_limiter import RateLimited, get_admission_stats
+from result_cache import content_hash
+from screener import SDK_PROFILE, Screener, load_genai
+from uploads import UploadLimitMiddleware, close_uploads, spool_uploads, upload_budget
+from usage_monitor import UsageMonitor
+
+IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_STARTED, 4)
+
+# Optional endpoints
+ENABLE_BULK = os.getenv("ENABLE_BULK", "true").lower() == "true"
+ENABLE_LIST_MODELS = os.getenv("ENABLE_LIST_MODELS", "true").lower() == "true"
+
+# Bulk screening limits
+MAX_BULK_FILES = int(os.getenv("MAX_BULK_FILES", "500"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "10"))
+# Resumes per Gemini call when /bulk-screen is called with packed=true
+PACK_SIZE = int(os.getenv("PACK_SIZE", "5"))
+
+# Asynchronous job queue for very large batches
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "true").lower() == "true"
+MAX_JOB_FILES = int(os.getenv("MAX_JOB_FILES", "5000"))
+
+# Most stored candidates screened by one /candidates/screen request
+MAX_RESCREEN_CANDIDATES = int(os.getenv("MAX_RESCREEN_CANDIDATES", "5000"))
+
+# Usage tracking (api_usage.db) - set ENABLE_USAGE_TRACKING=true to record API usage and costs
+ENABLE_USAGE_TRACKING = os.getenv("ENABLE_USAGE_TRACKING", "false").lower() == "true"
+
+# Build the model pool in the background at startup (false = when the first health probe runs)
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+
+
+def ndjson_response(tasks, uploads=()):
+    """Stream every task's result items as NDJSON lines, in the order the tasks finish"""
+    async def ndjson_results():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for item in await finished:
+                    yield json.dumps(item) + "\n"
+        finally:
+            # Client went away - don't keep paying for screenings nobody reads
+            for task in tasks:
+                task.cancel()
+            close_uploads(uploads)
+
+    return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+
+
+def sse_response(events, uploads=()):
+    """Send (event, data) pairs from an async generator as server-sent events"""
+    async def sse_events():
+        try:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            close_uploads(uploads)
+
+    return StreamingResponse(
+        sse_events(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come rather than buffer the response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def create_app(
+    title="Resume Screener API",
+    message="Resume Screener API - AI-powered resume analysis",
+    enable_bulk=ENABLE_BULK,
+    enable_jobs=JOB_QUEUE_ENABLED,
+    enable_list_models=ENABLE_LIST_MODELS,
+    enable_candidates=CANDIDATE_STORE_ENABLED,
+    enable_usage_tracking=ENABLE_USAGE_TRACKING,
+    warm_up=MODEL_WARMUP
+):
+    """
+    Build the FastAPI app.
+
+    Nothing here touches the network or imports the Gemini SDK - the model pool
+    is created by the warm-up task at startup, or by the first request that needs it.
+    """
+    created = time.perf_counter()
+
+    # Stored candidates can be re-screened against new requirements without re-upload
+    candidate_store = CandidateStore() if enable_candidates else None
+    screener = Screener(candidate_store=candidate_store)
+    # Upstream health is probed in the background and served from cache
+    health_probe = HealthProbe()
+    # Durable queue for /jobs - workers start with the app and screen through screen_pdf
+    job_queue = JobQueue() if enable_jobs else None
+
+    profile = {"import_seconds": IMPORT_SECONDS}
+
+    async def warm_up_model():
+        await screener.get_model()
+        # stderr, like the server's own logs - stdout may be carrying output (benchmark --json)
+        print(f"✅ Model pool ready in {screener.model_init_seconds}s ({screener.model_name})", file=sys.stderr)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        """Start the background tasks with the worker and stop them when it shuts down"""
+        start = time.perf_counter()
+        if enable_usage_tracking:
+            # Usage monitor - records every Gemini call with its real token counts
+            gemini_client.usage_monitor = UsageMonitor()
+        health_probe.start(screener.get_model)
+        if job_queue:
+            job_queue.start(screener.screen_pdf)
+        if warm_up:
+            app.state.warm_up_task = asyncio.create_task(warm_up_model())
+        profile["startup_seconds"] = round(time.perf_counter() - start, 4)
+        try:
+            yield
+        finally:
+            await health_probe.stop()
+            if job_queue:
+                await job_queue.stop()
+            screener.shutdown()
+
+    app = FastAPI(title=title, version="1.0.0", lifespan=lifespan)
+    # Oversized request bodies are refused while they stream in, before anything is spooled
+    app.add_middleware(UploadLimitMiddleware)
+    app.state.screener = screener
+
+    @app.middleware("http")
+    async def track_http_metrics(request: Request, call_next):
+        """Count requests and time them by route"""
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Label by route template (/jobs/{job_id}) rather than raw path to keep cardinality low
+            route = request.scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.observe(time.perf_counter() - start, method=request.method, path=path)
+            HTTP_REQUESTS.inc(method=request.method, path=path, status=status)
+
+    @app.exception_handler(RateLimited)
+    async def rate_limited_handler(request: Request, exc: RateLimited):
+        """Gemini quota is saturated - answer 429 with Retry-After instead of a generic error"""
+        return JSONResponse(
+            status_code=429,
+            content={"error": str(exc), "retry_after": exc.retry_after},
+            headers={"Retry-After": str(exc.retry_after)}
+        )
+
+    @app.get("/metrics")
+    def metrics():
+        """Prometheus metrics: request counts, in-flight gauges, per-stage latency and token usage"""
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/")
+    def read_root():
+        """API information"""
+        return {
+            "message": message,
+            "docs": "Visit /docs for interactive API documentation",
+            "status": screener.status,
+            "model": screener.model_name
+        }
+
+    @app.get("/health")
+    def health_check():
+        """Check if the API and AI model are working properly (cached - never calls Gemini itself)"""
+        if screener.status == "starting":
+            return {"status": "starting", "message": "Model is warming up", "model": screener.model_name}
+        if not screener.model:
+            return {
+                "status": "error",
+                "message": "Model not initialized",
+                "tip": "Check /list-models"
+            }
+        return {
+            "api": "google-gemini",
+            "model": screener.model_name,
+            **health_probe.get_status(),
+            "models": screener.model.get_stats(),
+            "escalation_models": screener.escalation_model.get_stats() if screener.escalation_model else [],
+            "admission": get_admission_stats()
+        }
+
+    @app.get("/health/live")
+    def liveness_check():
+        """Liveness probe - the process is up and serving requests"""
+        return {"status": "alive"}
+
+    @app.get("/health/ready")
+    def readiness_check():
+        """Readiness probe - 503 until the model is initialized and Gemini answered the last probe"""
+        upstream = health_probe.get_status()
+        ready = screener.model is not None and upstream["status"] == "healthy"
+        return JSONResponse(
+            {"ready": ready, "model": screener.model_name, **upstream},
+            status_code=200 if ready else 503
+        )
+
+    @app.get("/startup-profile")
+    def startup_profile():
+        """Import, startup and model warm-up timings for this worker"""
+        return {
+            "worker_pid": os.getpid(),
+            **profile,
+            **SDK_PROFILE,
+            "model_init_seconds": screener.model_init_seconds,
+            "model_status": screener.status
+        }
+
+    @app.get("/cache-stats")
+    def cache_stats():
+        """Hit/miss counters for the screening result cache and the near-duplicate index"""
+        stats = screener.result_cache.get_stats() if screener.result_cache else {"enabled": False}
+        stats["near_duplicates"] = (
+            screener.near_duplicates.get_stats() if screener.near_duplicates else {"enabled": False}
+        )
+        return stats
+
+    @app.get("/routing-stats")
+    def routing_stats():
+        """How often first-pass results are escalated to the stronger model, for tuning the band"""
+        return screener.router.get_stats()
+
+    @app.get("/extraction-stats")
+    def extraction_stats():
+        """PDF extraction pool, page budget, upload spooling and compaction statistics"""
+        return {
+            **screener.pdf_extractor.get_stats(),
+            "uploads": upload_budget.get_stats(),
+            "compaction": screener.compactor.get_stats()
+        }
+
+    if enable_list_models:
+        @app.get("/list-models")
+        def list_models():
+            """List all available Gemini models"""
+            try:
+                models = load_genai().list_models()
+                available = []
+                for m in models:
+                    if 'generateContent' in m.supported_generation_methods:
+                        available.append({
+                            "name": m.name.split('/')[-1],  # Just the model name
+                            "display_name": m.display_name,
+                            "description": m.description[:200]
+                        })
+                return {"available_models": available}
+            except Exception as e:
+                return {"error": str(e)}
+
+    @app.post("/screen-resume")
+    async def screen_resume(
+        file: UploadFile = File(...),
+        job_requirements: str = Form("")
+    ):
+        """
+        Analyze a resume against job requirements using AI.
+
+        Args:
+            file: PDF file of the resume
+            job_requirements: Job description or requirements to match against
+
+        Returns:
+            JSON with score, summary, strengths, concerns, and match percentage
+        """
+        with STAGE_LATENCY.time(stage="upload_read", model=screener.model_name):
+            uploads = await spool_uploads([file])
+        try:
+            return await screener.screen_pdf(uploads[0], job_requirements, uploads[0].filename)
+        finally:
+            close_uploads(uploads)
+
+    @app.post("/screen-resume/stream")
+    async def screen_resume_stream(
+        file: UploadFile = File(...),
+        job_requirements: str = Form("")
+    ):
+        """
+        Analyze a resume like /screen-resume, streaming progress as server-sent events.
+
+        Sends extraction and progress events while the resume is read and Gemini
+        generates, a partial event as soon as each field of the reply (score, summary,
+        strengths, ...) can be parsed, and finally a result event carrying the same
+        result /screen-resume returns (or an error event).
+        """
+        with STAGE_LATENCY.time(stage="upload_read", model=screener.model_name):
+            uploads = await spool_uploads([file])
+        return sse_response(screener.stream_pdf(uploads[0], job_requirements, uploads[0].filename), uploads)
+
+    if enable_bulk:
+        @app.post("/bulk-screen")
+        async def bulk_screen(
+            files: list[UploadFile] = File(...),
+            job_requirements: str = Form(""),
+            stream: bool = Form(False),
+            packed: bool = Form(False),
+            prefilter: bool = Form(False),
+            prefilter_top_k: int = Form(PREFILTER_TOP_K),
+            prefilter_min_score: float = Form(PREFILTER_MIN_SCORE),
+            dedup: bool | None = Form(None)
+        ):
+            """
+            Process multiple resumes at once (up to MAX_BULK_FILES).
+
+            Files are screened concurrently, BULK_CONCURRENCY at a time. With stream=true
+            each result is sent as a line of NDJSON as soon as it finishes, tagged with
+            the file's index in the upload so clients can map it back. With packed=true
+            resumes are screened PACK_SIZE per Gemini call, so the job requirements are
+            only sent once per group. With prefilter=true the batch is first ranked
+            locally with BM25 and only the top candidates are sent to Gemini; the rest
+            get a "prefiltered" result with their lexical score. With dedup=true
+            near-duplicate resumes are screened once: the others get a copy of that result
+            marked near_duplicate_of, as do resumes matching a recently screened one with
+            a cached result. Grouping needs the whole batch parsed first, so it is the
+            default (unless NEAR_DUPLICATE_ENABLED=false) only when not streaming.
+            """
+            if len(files) > MAX_BULK_FILES:
+                return {"error": f"Maximum {MAX_BULK_FILES} resumes per batch"}
+
+            # Spool every upload up front - Starlette closes its files once the request
+            # ends, which happens before a streaming response has finished
+            with STAGE_LATENCY.time(stage="upload_read", model=screener.model_name):
+                spooled = await spool_uploads(files)
+            uploads = [(index, upload.filename, upload) for index, upload in enumerate(spooled)]
+            semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+            if dedup is None:
+                # Streamed results should start arriving before the slowest PDF is parsed
+                dedup = NEAR_DUPLICATE_ENABLED and not stream
+
+            followers = {}
+            reused = []
+            if dedup:
+                uploads, followers, reused = await screener.dedup_uploads(uploads, job_requirements, packed)
+
+            skipped = []
+            if prefilter and job_requirements.strip():
+                uploads, skipped = await screener.prefilter_uploads(
+                    uploads, job_requirements, prefilter_top_k, prefilter_min_score
+                )
+
+            def rate_limited_items(group, error):
+                # One saturated call shouldn't sink the whole batch - report it per file
+                result = {"error": str(error), "retry_after": error.retry_after}
+                return [{"index": index, "filename": filename, "result": result} for index, filename, _ in group]
+
+            async def screen_one(index, filename, pdf_content):
+                async with semaphore:
+                    try:
+                        result = await screener.screen_pdf(pdf_content, job_requirements, filename)
+                    except RateLimited as e:
+                        return with_near_duplicates(rate_limited_items([(index, filename, pdf_content)], e), followers)
+                return with_near_duplicates([{"index": index, "filename": filename, "result": result}], followers)
+
+            async def screen_group(group):
+                async with semaphore:
+                    try:
+                        items = await screener.screen_pdf_group(group, job_requirements)
+                    except RateLimited as e:
+                        items = rate_limited_items(group, e)
+                return with_near_duplicates(items, followers)
+
+            if packed:
+                tasks = [
+                    asyncio.create_task(screen_group(uploads[start:start + PACK_SIZE]))
+                    for start in range(0, len(uploads), PACK_SIZE)
+                ]
+            else:
+                tasks = [asyncio.create_task(screen_one(*upload)) for upload in uploads]
+
+            async def answered(items):
+                return with_near_duplicates(items, followers)
+
+            # Prefiltered and recent near-duplicate results are known already
+            if skipped or reused:
+                tasks.append(asyncio.create_task(answered(skipped + reused)))
+
+            if stream:
+                return ndjson_response(tasks, spooled)
+
+            try:
+                results = [item for items in await asyncio.gather(*tasks) for item in items]
+            finally:
+                close_uploads(spooled)
+            results.sort(key=lambda item: item["index"])
+            return {
+                "processed": len(results),
+                "results": [
+                    {"filename": item["filename"], "result": item["result"]}
+                    for item in results
+                ]
+            }
+
+    if job_queue:
+        @app.post("/jobs")
+        async def submit_job(
+            files: list[UploadFile] = File(...),
+            job_requirements: str = Form("")
+        ):
+            """
+            Queue resumes for background screening (up to MAX_JOB_FILES).
+
+            Returns a job id right away; poll GET /jobs/{job_id} for progress and results.
+            """
+            if len(files) > MAX_JOB_FILES:
+                return {"error": f"Maximum {MAX_JOB_FILES} resumes per job"}
+
+            spooled = await spool_uploads(files)
+            try:
+                job_id = await job_queue.submit(job_requirements, [(upload.filename, upload) for upload in spooled])
+            finally:
+                close_uploads(spooled)
+            return {"job_id": job_id, "status": "queued", "total": len(spooled)}
+
+        @app.get("/jobs/{job_id}")
+        async def get_job(job_id: str, offset: int = 0, limit: int = 50):
+            """Progress counts for a job plus a page of finished results, in upload order"""
+            job = await job_queue.get_job(job_id, offset=max(offset, 0), limit=min(max(limit, 1), 500))
+            if job is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+            return job
+
+    if candidate_store:
+        @app.post("/candidates")
+        async def add_candidates(files: list[UploadFile] = File(...)):
+            """Store resumes for later re-screening, without screening them now"""
+            if len(files) > MAX_BULK_FILES:
+                return {"error": f"Maximum {MAX_BULK_FILES} resumes per batch"}
+
+            spooled = await spool_uploads(files)
+            try:
+                extractions = await asyncio.gather(
+                    *(screener.extract_resume(upload, upload.filename) for upload in spooled),
+                    return_exceptions=True
+                )
+            finally:
+                close_uploads(spooled)
+            stored = []
+            for upload, extraction in zip(spooled, extractions):
+                if isinstance(extraction, Exception):
+                    stored.append({"filename": upload.filename, "error": str(extraction) or type(extraction).__name__})
+                else:
+                    stored.append({"filename": upload.filename, "candidate_id": content_hash(upload)})
+            return {"stored": stored, "total": await candidate_store.count()}
+
+        @app.get("/candidates")
+        async def list_candidates(query: str = "", offset: int = 0, limit: int = 50):
+            """Stored candidates, newest first - or the best keyword matches for query"""
+            offset = max(offset, 0)
+            limit = min(max(limit, 1), 500)
+            if query.strip():
+                ranked = await candidate_store.search(query, limit, offset)
+                found = await candidate_store.get([candidate_id for candidate_id, _ in ranked])
+                candidates = []
+                for candidate_id, score in ranked:
+                    candidate = found[candidate_id]
+                    del candidate["text"]
+                    candidates.append({**candidate, "match_score": round(score, 3)})
+            else:
+                candidates = await candidate_store.list(limit, offset)
+            return {
+                "total": await candidate_store.count(),
+                "offset": offset,
+                "limit": limit,
+                "candidates": candidates
+            }
+
+        @app.get("/candidates/{candidate_id}")
+        async def get_candidate(candidate_id: str):
+            """A stored candidate's metadata and extracted text"""
+            candidate = (await candidate_store.get([candidate_id])).get(candidate_id)
+            if candidate is None:
+                raise HTTPException(status_code=404, detail="Candidate not found")
+            return candidate
+
+        @app.delete("/candidates/{candidate_id}")
+        async def delete_candidate(candidate_id: str):
+            """Remove a candidate and its index entries from the store"""
+            if not await candidate_store.delete(candidate_id):
+                raise HTTPException(status_code=404, detail="Candidate not found")
+            return {"deleted": True, "candidate_id": candidate_id}
+
+        @app.post("/candidates/screen")
+        async def screen_candidates(
+            job_requirements: str = Form(""),
+            query: str = Form(""),
+            candidate_ids: str = Form(""),
+            limit: int = Form(100),
+            stream: bool = Form(False)
+        ):
+            """
+            Screen stored candidates against new job requirements - no upload or PDF parsing.
+
+            Picks candidate_ids (comma-separated) if given, else the best `limit` keyword
+            matches for query, else the `limit` most recently stored candidates. Screened
+            BULK_CONCURRENCY at a time; stream=true sends NDJSON as results finish.
+            """
+            limit = min(max(limit, 1), MAX_RESCREEN_CANDIDATES)
+            match_scores = {}
+            if candidate_ids.strip():
+                selected = [candidate_id.strip() for candidate_id in candidate_ids.split(",") if candidate_id.strip()]
+                selected = list(dict.fromkeys(selected))[:limit]
+            elif query.strip():
+                ranked = await candidate_store.search(query, limit)
+                selected = [candidate_id for candidate_id, _ in ranked]
+                match_scores = dict(ranked)
+            else:
+                selected = [candidate["candidate_id"] for candidate in await candidate_store.list(limit)]
+            candidates = await candidate_store.get(selected)
+            semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+
+            async def screen_one(index, candidate_id):
+                candidate = candidates.get(candidate_id)
+                item = {
+                    "index": index,
+                    "candidate_id": candidate_id,
+                    "filename": candidate["filename"] if candidate else None
+                }
+                if candidate_id in match_scores:
+                    item["match_score"] = round(match_scores[candidate_id], 3)
+                if candidate is None:
+                    return [{**item, "result": {"error": "Candidate not found"}}]
+                async with semaphore:
+                    try:
+                        result = await screener.screen_candidate(candidate, job_requirements)
+                    except RateLimited as e:
+                        result = {"error": str(e), "retry_after": e.retry_after}
+                return [{**item, "result": result}]
+
+            tasks = [asyncio.create_task(screen_one(index, candidate_id)) for index, candidate_id in enumerate(selected)]
+            if stream:
+                return ndjson_response(tasks)
+
+            results = [item for items in await asyncio.gather(*tasks) for item in items]
+            results.sort(key=lambda item: item["index"])
+            for item in results:
+                del item["index"]
+            return {"processed": len(results), "results": results}
+
+    @app.get("/api-info")
+    def api_info():
+        """Get information about the API and its capabilities"""
+        endpoints = {"/docs": "Interactive API documentation"}
+        for route in app.routes:
+            if isinstance(route, APIRoute) and route.include_in_schema:
+                summary = (route.endpoint.__doc__ or route.name).strip().splitlines()[0]
+                endpoints.setdefault(route.path, summary)
+        return {
+            "api": "Google Gemini",
+            "model": screener.model_name,
+            "model_status": screener.status,
+            "features": [
+                "PDF resume parsing",
+                "AI-powered analysis",
+                "Job requirement matching",
+                "Strength and concern identification",
+                "Compatibility scoring",
+                "Streaming results (server-sent events)",
+                *(["Tiered model routing for borderline candidates"] if screener.router.enabled else [])
+            ],
+            "endpoints": endpoints
+        }
+
+    profile["create_app_seconds"] = round(time.perf_counter() - created, 4)
+    return app
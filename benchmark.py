@@ -0,0 +1,527 @@
+#!/usr/bin/env python
+"""
+Benchmark - reproducible load and latency runs against a local fake Gemini backend
+Swaps genai.GenerativeModel for an in-process stand-in with configurable latency and
+failure rates, generates a synthetic PDF corpus, drives /screen-resume, its streaming
+variant or /bulk-screen at a fixed concurrency and reports throughput plus p50/p95/p99
+for every stage. No API key or network access is needed, so any performance change can
+be checked offline:
+
+    python benchmark.py --endpoint screen --requests 200 --concurrency 16
+    python benchmark.py --endpoint stream --requests 100 --llm-latency 2
+    python benchmark.py --endpoint bulk --requests 20 --bulk-size 25 --llm-latency 0.8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+WORDS = (
+    "python fastapi kubernetes aws gcp docker postgres redis kafka terraform react typescript "
+    "leadership mentoring architecture scalability latency migration testing ci cd observability "
+    "customer stakeholders roadmap delivery analytics pipeline spark airflow security compliance"
+).split()
+
+SECTIONS = ("Summary", "Experience", "Skills", "Education", "Projects", "Certifications")
+
+LINES_PER_PAGE = 45
+
+# Streamed fake replies: share of the latency before the first chunk, and chunk size
+FIRST_CHUNK_SHARE = 0.25
+STREAM_CHUNK_CHARS = 24
+
+
+# ---------------------------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------------------------
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages):
+    """A minimal valid PDF with one Helvetica text stream per page (pages is a list of line lists)"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    page_numbers = []
+    for lines in pages:
+        body = "BT /F1 10 Tf 50 770 Td 16 TL " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        stream = body.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_number = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_number
+        )
+        page_numbers.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % number for number in page_numbers)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_numbers))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_at = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(output)
+
+
+def make_resume_pages(rng, candidate, page_count):
+    """Resume-like text: a contact block, then sections of keyword-heavy bullet points"""
+    lines = [f"Candidate {candidate}", f"candidate{candidate}@example.com | +1 555 01{candidate % 100:02d}", ""]
+    while len(lines) < page_count * LINES_PER_PAGE:
+        lines.append(rng.choice(SECTIONS))
+        for _ in range(rng.randint(4, 10)):
+            lines.append("- " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))))
+        lines.append("")
+    lines = lines[:page_count * LINES_PER_PAGE]
+    return [lines[start:start + LINES_PER_PAGE] for start in range(0, len(lines), LINES_PER_PAGE)]
+
+
+def make_corpus(size, min_pages=1, max_pages=4, seed=0, near_duplicates=0.0):
+    """
+    size distinct PDFs with page counts drawn uniformly from min_pages..max_pages.
+
+    A near_duplicates share of them are re-exports of an earlier resume with one bullet
+    point rewritten, like an applicant sending a lightly edited copy.
+    """
+    rng = random.Random(seed)
+    corpus_pages = []
+    for candidate in range(size):
+        if near_duplicates and corpus_pages and rng.random() < near_duplicates:
+            pages = [list(page) for page in rng.choice(corpus_pages)]
+            page = rng.choice(pages)
+            page[rng.randrange(len(page))] = "- " + " ".join(rng.choice(WORDS) for _ in range(10))
+        else:
+            pages = make_resume_pages(rng, candidate, rng.randint(min_pages, max_pages))
+        corpus_pages.append(pages)
+    return [(f"resume_{candidate:04d}.pdf", make_pdf(pages)) for candidate, pages in enumerate(corpus_pages)]
+
+
+# ---------------------------------------------------------------------------
+# Fake Gemini backend
+# ---------------------------------------------------------------------------
+
+class FakeUpstreamError(Exception):
+    """Stands in for a Gemini 5xx - carries a status code so the pool retries it"""
+
+    def __init__(self, message, code=503):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, text, prompt_tokens):
+        self.text = text
+        self.usage_metadata = FakeUsage(prompt_tokens, len(text) // 4)
+
+
+class FakeStreamResponse:
+    """A streamed reply - chunks arrive evenly spread over duration seconds"""
+
+    def __init__(self, text, prompt_tokens, duration):
+        self.chunks = [text[start:start + STREAM_CHUNK_CHARS] for start in range(0, len(text), STREAM_CHUNK_CHARS)]
+        self.interval = duration / max(1, len(self.chunks) - 1)
+        self.final_usage = FakeUsage(prompt_tokens, len(text) // 4)
+        # Like the SDK, usage is only known once the stream has been read
+        self.usage_metadata = None
+
+    async def __aiter__(self):
+        for position, chunk in enumerate(self.chunks):
+            if position:
+                await asyncio.sleep(self.interval)
+            yield SimpleNamespace(text=chunk)
+        self.usage_metadata = self.final_usage
+
+
+class FakeBackend:
+    """
+    Latency and failure model shared by every fake model.
+
+    Latency is log-normal around latency seconds (sigma = jitter). failure_rate of calls
+    raise a retryable upstream error after the drawn latency, and stall_rate of calls
+    hang for stall_seconds - long enough to hit LLM_TIMEOUT when that is set low.
+    model_latencies overrides latency for named models (e.g. a slower escalation model).
+    """
+
+    def __init__(self, latency=0.5, jitter=0.3, failure_rate=0.0, stall_rate=0.0, stall_seconds=None, seed=0,
+                 model_latencies=None):
+        self.latency = latency
+        self.model_latencies = model_latencies or {}
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds if stall_seconds is not None else latency * 20
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.calls_by_model = defaultdict(int)
+        self.failures = 0
+        self.stalls = 0
+
+    def draw(self, model_name=None):
+        """(delay, fails) for the next call"""
+        self.calls += 1
+        self.calls_by_model[model_name] += 1
+        latency = self.model_latencies.get(model_name, self.latency)
+        roll = self.rng.random()
+        if roll < self.stall_rate:
+            self.stalls += 1
+            return self.stall_seconds, False
+        delay = latency * self.rng.lognormvariate(0, self.jitter) if self.jitter else latency
+        if roll < self.stall_rate + self.failure_rate:
+            self.failures += 1
+            return delay, True
+        return delay, False
+
+    def reply(self, prompt):
+        """A schema-conforming reply; packed prompts get one entry per candidate"""
+        score = self.rng.randint(1, 10)
+        packed = re.findall(r"=== Candidate (\d+) ===", prompt)
+        if not packed:
+            return json.dumps(self._result(score))
+        return json.dumps([{"candidate": int(number), **self._result(self.rng.randint(1, 10))} for number in packed])
+
+    @staticmethod
+    def _result(score):
+        return {
+            "score": score,
+            "summary": "Synthetic candidate. Generated by the benchmark backend.",
+            "strengths": ["python", "delivery"],
+            "concerns": ["synthetic"],
+            "match_percentage": score * 10
+        }
+
+    def get_stats(self):
+        return {
+            "calls": self.calls,
+            "calls_by_model": dict(self.calls_by_model),
+            "failures": self.failures,
+            "stalls": self.stalls
+        }
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel covering the calls the app makes"""
+
+    backend = FakeBackend()
+
+    def __init__(self, model_name, **kwargs):
+        self.name = model_name
+        self.model_name = f"models/{model_name}"
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        delay, fails = self.backend.draw(self.name)
+        # Streamed replies start after a share of the latency and trickle in over the rest
+        first_chunk = delay * FIRST_CHUNK_SHARE if stream else delay
+        await asyncio.sleep(first_chunk)
+        if fails:
+            raise FakeUpstreamError("fake upstream error")
+        prompt = str(prompt)
+        if stream:
+            return FakeStreamResponse(self.backend.reply(prompt), len(prompt) // 4, delay - first_chunk)
+        return FakeResponse(self.backend.reply(prompt), len(prompt) // 4)
+
+    async def count_tokens_async(self, contents):
+        return FakeUsage(len(str(contents)) // 4, 0)
+
+
+def install_fake_backend(backend):
+    """Point the genai SDK at the fake model - must run before the app module is imported"""
+    import google.generativeai as genai
+
+    FakeGenerativeModel.backend = backend
+    genai.GenerativeModel = FakeGenerativeModel
+    genai.configure = lambda **kwargs: None
+    genai.list_models = lambda: []
+
+
+# ---------------------------------------------------------------------------
+# Load driver
+# ---------------------------------------------------------------------------
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, int(round(fraction * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class StageRecorder:
+    """Keeps every STAGE_LATENCY observation so exact percentiles can be reported"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def install(self, histogram):
+        observe = histogram.observe
+
+        def recording_observe(value, **labels):
+            self.samples[labels.get("stage", "unknown")].append(value)
+            observe(value, **labels)
+
+        histogram.observe = recording_observe
+
+    def record(self, stage, value):
+        self.samples[stage].append(value)
+
+
+async def asgi_stream(app, request, on_body):
+    """
+    Run one httpx request through the ASGI app, calling on_body(chunk) as each part of
+    the response body is sent - httpx's ASGITransport only returns once the body is
+    complete, which would hide time to first byte. Returns the status code.
+    """
+    body = request.read()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": request.method,
+        "scheme": "http",
+        "path": request.url.path,
+        "raw_path": request.url.raw_path.split(b"?")[0],
+        "query_string": request.url.query,
+        "root_path": "",
+        "headers": [(name.lower(), value) for name, value in request.headers.raw],
+        "server": ("benchmark", 80),
+        "client": ("127.0.0.1", 0)
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # The client never disconnects
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            on_body(message["body"])
+
+    await app(scope, receive, send)
+    return status
+
+
+async def drive(app, corpus, endpoint, requests, concurrency, bulk_size, job_requirements, bulk_options, recorder):
+    """Send requests to the app in-process at a fixed concurrency and collect per-request outcomes"""
+    import httpx
+
+    statuses = defaultdict(int)
+    next_file = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def take(count):
+        nonlocal next_file
+        batch = [corpus[(next_file + offset) % len(corpus)] for offset in range(count)]
+        next_file += count
+        return batch
+
+    async def one_request(client):
+        async with semaphore:
+            if endpoint in ("screen", "stream"):
+                name, content = take(1)[0]
+                url = "/screen-resume/stream" if endpoint == "stream" else "/screen-resume"
+                files = [("file", (name, content, "application/pdf"))]
+            else:
+                url = "/bulk-screen"
+                files = [("files", (name, content, "application/pdf")) for name, content in take(bulk_size)]
+            data = {"job_requirements": job_requirements, **(bulk_options if endpoint == "bulk" else {})}
+
+            if endpoint == "stream":
+                # Time to the first event and to the first partial result carrying a score
+                firsts = {}
+
+                def on_body(chunk):
+                    elapsed = time.perf_counter() - start
+                    firsts.setdefault("first_event", elapsed)
+                    if b'"score"' in chunk:
+                        firsts.setdefault("first_score", elapsed)
+
+                request = client.build_request("POST", url, files=files, data=data)
+                start = time.perf_counter()
+                status = await asgi_stream(app, request, on_body)
+                recorder.record("request", time.perf_counter() - start)
+                for stage, elapsed in firsts.items():
+                    recorder.record(stage, elapsed)
+                statuses[status] += 1
+                return
+
+            start = time.perf_counter()
+            response = await client.post(url, files=files, data=data)
+            recorder.record("request", time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(one_request(client) for _ in range(requests)))
+            elapsed = time.perf_counter() - start
+    return elapsed, dict(statuses)
+
+
+def build_report(args, elapsed, statuses, recorder, backend):
+    resumes = args.requests * (args.bulk_size if args.endpoint == "bulk" else 1)
+    stages = {}
+    for stage, samples in sorted(recorder.samples.items()):
+        stages[stage] = {
+            "count": len(samples),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 1)
+        }
+    return {
+        "endpoint": args.endpoint,
+        "requests": args.requests,
+        "resumes": resumes,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(args.requests / elapsed, 2),
+        "resumes_per_second": round(resumes / elapsed, 2),
+        "status_codes": statuses,
+        "backend": backend.get_stats(),
+        # ru_maxrss is in KB on Linux - the PDF pool's processes are not included
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": stages
+    }
+
+
+ENDPOINT_PATHS = {"screen": "/screen-resume", "stream": "/screen-resume/stream", "bulk": "/bulk-screen"}
+
+
+def print_report(report):
+    print("\n📊 BENCHMARK RESULTS")
+    print("=" * 64)
+    print(f"Endpoint:     {ENDPOINT_PATHS[report['endpoint']]}")
+    print(f"Requests:     {report['requests']} ({report['resumes']} resumes) at concurrency {report['concurrency']}")
+    print(f"Elapsed:      {report['elapsed_seconds']}s")
+    print(f"Throughput:   {report['requests_per_second']} req/s, {report['resumes_per_second']} resumes/s")
+    print(f"Status codes: {report['status_codes']}")
+    print(f"Fake Gemini:  {report['backend']}")
+    print(f"Peak RSS:     {report['peak_rss_mb']} MB")
+    print("-" * 64)
+    print(f"{'stage':<18}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<18}{row['count']:>8}{row['p50_ms']:>12}{row['p95_ms']:>12}{row['p99_ms']:>12}")
+    print("=" * 64)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load benchmark with a fake Gemini backend")
+    parser.add_argument("--app", default="app_secure", help="App module to benchmark (app or app_secure)")
+    parser.add_argument("--endpoint", choices=tuple(ENDPOINT_PATHS), default="screen")
+    parser.add_argument("--requests", type=int, default=100, help="Requests to send")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--bulk-size", type=int, default=20, help="Files per /bulk-screen request")
+    parser.add_argument("--packed", action="store_true", help="Use packed bulk screening")
+    parser.add_argument("--prefilter", action="store_true", help="Use the BM25 pre-filter on bulk requests")
+    parser.add_argument("--no-dedup", action="store_true", help="Screen near-duplicate resumes in bulk requests separately")
+    parser.add_argument("--corpus-size", type=int, default=200, help="Distinct synthetic PDFs")
+    parser.add_argument("--near-duplicates", type=float, default=0.0,
+                        help="Share of the corpus that are lightly edited copies of other resumes")
+    parser.add_argument("--min-pages", type=int, default=1)
+    parser.add_argument("--max-pages", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Median fake Gemini latency in seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Log-normal sigma of the latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls failing with a 503")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Fraction of calls that hang")
+    parser.add_argument("--stall-seconds", type=float, default=None, help="How long stalled calls hang")
+    parser.add_argument("--escalation-models", default="",
+                        help="ESCALATION_MODELS for tiered routing (default: single tier)")
+    parser.add_argument("--escalation-latency", type=float, default=None,
+                        help="Median fake latency of the escalation models (default: 3x --llm-latency)")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache on (off by default)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the corpus and the fake backend")
+    parser.add_argument("--job-requirements", default="Senior Python developer with cloud experience")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="resume-benchmark-")
+
+    # Only Gemini is faked - everything else runs as in production, minus
+    # quotas and stores that would make runs depend on earlier ones
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["GEMINI_RPM"] = "0"
+    os.environ["GEMINI_TPM"] = "0"
+    os.environ["ENABLE_USAGE_TRACKING"] = "false"
+    os.environ["JOB_QUEUE_ENABLED"] = "false"
+    os.environ["RESULT_CACHE_ENABLED"] = "true" if args.cache else "false"
+    os.environ["RESULT_CACHE_DB"] = os.path.join(workdir, "screening_cache.db")
+    os.environ["CANDIDATE_STORE_DB"] = os.path.join(workdir, "candidates.db")
+    os.environ["ESCALATION_MODELS"] = args.escalation_models
+    os.environ["MAX_BULK_FILES"] = str(max(args.bulk_size, int(os.getenv("MAX_BULK_FILES", "500"))))
+
+    backend = FakeBackend(
+        latency=args.llm_latency,
+        jitter=args.llm_jitter,
+        failure_rate=args.failure_rate,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        seed=args.seed,
+        model_latencies={
+            name.strip().partition(":")[0]: args.escalation_latency or args.llm_latency * 3
+            for name in args.escalation_models.split(",") if name.strip()
+        }
+    )
+    install_fake_backend(backend)
+
+    import importlib
+    from metrics import STAGE_LATENCY
+
+    recorder = StageRecorder()
+    recorder.install(STAGE_LATENCY)
+    app = importlib.import_module(args.app).app
+
+    corpus = make_corpus(args.corpus_size, args.min_pages, args.max_pages, seed=args.seed, near_duplicates=args.near_duplicates)
+    bulk_options = {
+        "packed": str(args.packed).lower(),
+        "prefilter": str(args.prefilter).lower(),
+        "dedup": str(not args.no_dedup).lower()
+    }
+    elapsed, statuses = asyncio.run(drive(
+        app, corpus, args.endpoint, args.requests, args.concurrency,
+        args.bulk_size, args.job_requirements, bulk_options, recorder
+    ))
+
+    report = build_report(args, elapsed, statuses, recorder, backend)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
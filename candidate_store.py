@@ -0,0 +1,225 @@
+"""
+Candidate Store - keep every resume's extracted text once, searchable
+Text and metadata live in a SQLite file next to an inverted index (term -> candidate,
+term frequency), so a new requisition can be screened against the stored pool, or a
+keyword-matched slice of it, without re-uploading or re-parsing a single PDF.
+Resumes are personal data: the store is opt-in, and candidates not seen again within
+CANDIDATE_STORE_TTL are deleted
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from prefilter import BM25_B, BM25_K1, tokenize
+
+CANDIDATE_STORE_ENABLED = os.getenv("CANDIDATE_STORE_ENABLED", "false").lower() == "true"
+CANDIDATE_STORE_DB = os.getenv("CANDIDATE_STORE_DB", "candidates.db")
+# Seconds a candidate is kept after it was last uploaded (0 = keep until deleted)
+CANDIDATE_STORE_TTL = int(os.getenv("CANDIDATE_STORE_TTL", str(30 * 24 * 3600)))
+
+# Remove expired candidates at most this often (seconds)
+PURGE_INTERVAL = 60
+
+
+class CandidateStore:
+    def __init__(self, db_path=CANDIDATE_STORE_DB, ttl=CANDIDATE_STORE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.purged_at = 0.0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS candidates (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                text TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                pages_parsed INTEGER,
+                pages_skipped INTEGER,
+                created_at REAL NOT NULL,
+                last_seen_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                candidate_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, candidate_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_by_candidate ON postings (candidate_id);
+            CREATE INDEX IF NOT EXISTS candidates_by_created ON candidates (created_at);
+            CREATE INDEX IF NOT EXISTS candidates_by_last_seen ON candidates (last_seen_at);
+            """
+        )
+
+    def _expire(self, now):
+        """Delete candidates past the TTL; called with the lock held, runs every PURGE_INTERVAL"""
+        if not self.ttl or now - self.purged_at < PURGE_INTERVAL:
+            return
+        self.purged_at = now
+        cutoff = now - self.ttl
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute(
+                "DELETE FROM postings WHERE candidate_id IN"
+                " (SELECT id FROM candidates WHERE last_seen_at <= ?)",
+                (cutoff,)
+            )
+            self.db.execute("DELETE FROM candidates WHERE last_seen_at <= ?", (cutoff,))
+            self.db.execute("COMMIT")
+        except Exception:
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            raise
+
+    # --- storage (blocking, called through asyncio.to_thread) ---
+
+    def _add(self, candidate_id, filename, extraction):
+        """Store and index a candidate once; later sightings only refresh last_seen_at"""
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            updated = self.db.execute(
+                "UPDATE candidates SET last_seen_at = ?, filename = COALESCE(?, filename) WHERE id = ?",
+                (now, filename, candidate_id)
+            ).rowcount
+            if updated:
+                return False
+
+            tokens = tokenize(extraction["text"])
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute(
+                    "INSERT OR IGNORE INTO candidates (id, filename, text, length, pages_parsed, pages_skipped,"
+                    " created_at, last_seen_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        candidate_id, filename, extraction["text"], len(tokens),
+                        extraction.get("pages_parsed"), extraction.get("pages_skipped"), now, now
+                    )
+                )
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO postings (term, candidate_id, tf) VALUES (?, ?, ?)",
+                    [(term, candidate_id, count) for term, count in Counter(tokens).items()]
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+                raise
+        return True
+
+    def _search(self, query, limit, offset):
+        """BM25 over the whole store, computed from the postings of the query terms"""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self.lock:
+            self._expire(time.time())
+            count, average_length = self.db.execute(
+                "SELECT COUNT(*), AVG(length) FROM candidates"
+            ).fetchone()
+            rows = self.db.execute(
+                "SELECT postings.term, postings.candidate_id, postings.tf, candidates.length"
+                " FROM postings JOIN candidates ON candidates.id = postings.candidate_id"
+                f" WHERE postings.term IN ({placeholders})",
+                terms
+            ).fetchall()
+        if not rows:
+            return []
+
+        doc_freqs = Counter(term for term, _, _, _ in rows)
+        average_length = average_length or 1.0
+        scores = Counter()
+        for term, candidate_id, tf, length in rows:
+            idf = math.log(1 + (count - doc_freqs[term] + 0.5) / (doc_freqs[term] + 0.5))
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            scores[candidate_id] += idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[offset:offset + limit]
+
+    def _list(self, limit, offset):
+        with self.lock:
+            self._expire(time.time())
+            rows = self.db.execute(
+                "SELECT id, filename, length, pages_parsed, pages_skipped, created_at, last_seen_at"
+                " FROM candidates ORDER BY created_at DESC, id LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [self._metadata(row) for row in rows]
+
+    def _get(self, candidate_ids):
+        """{candidate_id: metadata plus text} for the ids that exist"""
+        if not candidate_ids:
+            return {}
+        placeholders = ",".join("?" * len(candidate_ids))
+        with self.lock:
+            self._expire(time.time())
+            rows = self.db.execute(
+                "SELECT id, filename, length, pages_parsed, pages_skipped, created_at, last_seen_at, text"
+                f" FROM candidates WHERE id IN ({placeholders})",
+                list(candidate_ids)
+            ).fetchall()
+        return {row[0]: {**self._metadata(row[:7]), "text": row[7]} for row in rows}
+
+    def _delete(self, candidate_id):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("DELETE FROM postings WHERE candidate_id = ?", (candidate_id,))
+                deleted = self.db.execute("DELETE FROM candidates WHERE id = ?", (candidate_id,)).rowcount
+                self.db.execute("COMMIT")
+            except Exception:
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+                raise
+        return bool(deleted)
+
+    def _count(self):
+        with self.lock:
+            self._expire(time.time())
+            return self.db.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+    @staticmethod
+    def _metadata(row):
+        candidate_id, filename, length, pages_parsed, pages_skipped, created_at, last_seen_at = row
+        return {
+            "candidate_id": candidate_id,
+            "filename": filename,
+            "tokens": length,
+            "pages_parsed": pages_parsed,
+            "pages_skipped": pages_skipped,
+            "created_at": created_at,
+            "last_seen_at": last_seen_at
+        }
+
+    # --- async API ---
+
+    async def add(self, candidate_id, filename, extraction):
+        """Store an extracted resume under its content hash; returns True if it was new"""
+        return await asyncio.to_thread(self._add, candidate_id, filename, extraction)
+
+    async def search(self, query, limit=50, offset=0):
+        """[(candidate_id, bm25 score)] for candidates matching any query term, best first"""
+        return await asyncio.to_thread(self._search, query, limit, offset)
+
+    async def list(self, limit=50, offset=0):
+        """Candidate metadata, newest first"""
+        return await asyncio.to_thread(self._list, limit, offset)
+
+    async def get(self, candidate_ids):
+        return await asyncio.to_thread(self._get, candidate_ids)
+
+    async def delete(self, candidate_id):
+        return await asyncio.to_thread(self._delete, candidate_id)
+
+    async def count(self):
+        return await asyncio.to_thread(self._count)
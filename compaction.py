@@ -0,0 +1,255 @@
+"""
+Resume Compaction - fit the most useful parts of a resume into a token budget
+Sits between PDF extraction and prompt construction: normalizes whitespace, drops
+page headers/footers, page numbers and contact lines, detects sections and fills
+RESUME_TOKEN_BUDGET by section priority (experience and skills first) instead of
+keeping whatever happens to come first in the file
+"""
+
+import os
+import re
+import threading
+from collections import Counter
+
+# Tokens of resume text sent to the model (~4 characters per token)
+RESUME_TOKEN_BUDGET = int(os.getenv("RESUME_TOKEN_BUDGET", "750"))
+
+CHARS_PER_TOKEN = 4
+
+# Section headings, matched against a whole (short) line
+SECTION_PATTERNS = [
+    ("experience", r"((work|professional|employment|relevant|industry) )?(experience|history)|employment|career history"),
+    ("skills", r"((technical|core|key) )?(skills|competencies|technologies|tech stack|expertise)( & tools| and tools)?"),
+    ("summary", r"((professional|career) )?(summary|profile|objective)|about me"),
+    ("projects", r"((selected|personal|key|side) )?projects"),
+    ("education", r"education|academic background|qualifications"),
+    ("certifications", r"certifications?|licen[cs]es|courses|training"),
+    ("other", r"awards|honou?rs|publications|languages|interests|hobbies|volunteering|references"),
+]
+SECTION_HEADINGS = [(name, re.compile(pattern)) for name, pattern in SECTION_PATTERNS]
+
+# Lower comes first when the budget is handed out
+SECTION_PRIORITY = {
+    "experience": 0,
+    "skills": 1,
+    "summary": 2,
+    "projects": 3,
+    "education": 4,
+    "certifications": 5,
+    "header": 6,
+    "other": 7
+}
+
+MAX_HEADING_CHARS = 40
+
+# Running headers and footers are only looked for in documents this long, and only
+# among the first and last few lines of each page
+HEADER_MIN_PAGES = 3
+HEADER_EDGE_LINES = 3
+
+# Digit runs other than years - masked so "Page 2" matches "Page 3" but "2014 - 2017" stays itself
+NON_YEAR_DIGITS = re.compile(r"(?<!\d)(?!(?:19|20)\d\d(?!\d))\d+")
+# "3", "Page 3", "3 of 5", "3/5" - a bare number of four digits or more is more likely a year
+PAGE_NUMBER = re.compile(r"page\s*\d+(\s*(of|/)\s*\d+)?|\d{1,3}(\s*(of|/)\s*\d{1,3})?", re.IGNORECASE)
+CONTACT = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+|https?://\S+|www\.\S+|linkedin\.com/\S*|github\.com/\S*")
+PHONE = re.compile(r"\+?\(?\d{1,4}\)?(?:[ .-]?\(?\d{2,4}\)?){2,5}")
+# Fewer digits than this is a date range or an ID, not a phone number
+MIN_PHONE_DIGITS = 9
+
+
+def estimate_text_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _normalize_line(line):
+    return " ".join(line.split())
+
+
+def _section_of(line):
+    """Section name if line is a heading, else None"""
+    if len(line) > MAX_HEADING_CHARS:
+        return None
+    heading = line.strip(" :-|•*#").lower()
+    for name, pattern in SECTION_HEADINGS:
+        if pattern.fullmatch(heading):
+            return name
+    return None
+
+
+def _is_noise(line):
+    """Page numbers and lines that are nothing but contact details"""
+    if PAGE_NUMBER.fullmatch(line):
+        return True
+    if "@" not in line and "/" not in line and "www." not in line and not PHONE.search(line):
+        return False
+    rest = CONTACT.sub("", line)
+    rest = PHONE.sub(lambda match: "" if sum(c.isdigit() for c in match.group()) >= MIN_PHONE_DIGITS else match.group(), rest)
+    return not rest.strip(" |,;·•-")
+
+
+def _edge_lines(page):
+    """
+    {position: (distance from the top or bottom, line with non-year digits masked)} for the
+    short lines at either end of a page - a running header sits in the same place on every page
+    """
+    edges = {}
+    for offset in range(min(HEADER_EDGE_LINES, len(page))):
+        for position, key in ((offset, offset), (len(page) - 1 - offset, -1 - offset)):
+            if len(page[position]) <= 80:
+                edges.setdefault(position, (key, NON_YEAR_DIGITS.sub("#", page[position])))
+    return edges
+
+
+def clean_pages(text):
+    r"""
+    Normalized, non-empty lines with page furniture removed.
+
+    Pages are separated by form feeds in extracted text. In documents of at least
+    HEADER_MIN_PAGES pages, short lines at the top or bottom of most pages are
+    running headers or footers and are dropped there. Dates and titles that recur
+    in the body are content:
+
+    >>> page = "Software Engineer\nAcme\n2020 - 2023\nBuilt APIs\n2019"
+    >>> clean_pages(page + "\f" + page.replace("Acme", "Initech").replace("2020 - 2023", "2014 - 2017"))
+    ... # doctest: +NORMALIZE_WHITESPACE
+    ['Software Engineer', 'Acme', '2020 - 2023', 'Built APIs', '2019',
+     'Software Engineer', 'Initech', '2014 - 2017', 'Built APIs', '2019']
+    """
+    pages = [
+        [_normalize_line(line) for line in page.splitlines()]
+        for page in text.split("\f")
+    ]
+    pages = [[line for line in page if line] for page in pages]
+
+    if len(pages) >= HEADER_MIN_PAGES:
+        edges = [_edge_lines(page) for page in pages]
+        seen = Counter(masked for page_edges in edges for masked in set(page_edges.values()))
+        repeated = {masked for masked, count in seen.items() if count >= max(2, len(pages) / 2)}
+        pages = [
+            [line for position, line in enumerate(page) if page_edges.get(position) not in repeated]
+            for page, page_edges in zip(pages, edges)
+        ]
+
+    return [line for page in pages for line in page if not _is_noise(line)]
+
+
+def split_sections(lines):
+    """[(section name, heading line or None, body lines)] in document order"""
+    sections = [["header", None, []]]
+    for line in lines:
+        name = _section_of(line)
+        if name:
+            sections.append([name, line, []])
+        else:
+            sections[-1][2].append(line)
+    return [tuple(section) for section in sections if section[1] or section[2]]
+
+
+def _take(lines, allowance):
+    """
+    Whole lines fitting in allowance characters, the last one cut at a word boundary
+    if there is room for it. Returns (lines, characters used, whether a line was cut).
+    """
+    taken = []
+    used = 0
+    for line in lines:
+        cost = len(line) + 1
+        if used + cost <= allowance:
+            taken.append(line)
+            used += cost
+            continue
+        room = allowance - used
+        if room >= MAX_HEADING_CHARS:
+            taken.append(line[:room - 2].rsplit(" ", 1)[0] + " …")
+            return taken, allowance, True
+        break
+    return taken, used, False
+
+
+def compact_resume(text, token_budget=RESUME_TOKEN_BUDGET):
+    """
+    Compact extracted resume text to at most token_budget tokens.
+
+    The budget is handed out in two passes by section priority: first each section
+    gets up to half the budget, so one long experience section can't crowd out the
+    skills list, then whatever is left goes to the sections that still have text.
+    Kept sections are emitted in their original order.
+
+    Returns a dict with the compacted text, token counts before and after, the
+    compression ratio (original / compacted) and the sections that made it in.
+    """
+    original_tokens = estimate_text_tokens(text or "")
+    budget = token_budget * CHARS_PER_TOKEN
+    sections = split_sections(clean_pages(text or ""))
+
+    order = sorted(range(len(sections)), key=lambda position: SECTION_PRIORITY[sections[position][0]])
+    granted = [[] for _ in sections]
+    spent = [0] * len(sections)
+    finished = set()
+    remaining = budget
+    for share in (budget // 2, budget):
+        for position in order:
+            _, heading, body = sections[position]
+            rest = body[len(granted[position]):]
+            if remaining <= 0 or position in finished or not rest:
+                continue
+            heading_cost = len(heading) + 1 if heading and not granted[position] else 0
+            allowance = min(share - spent[position], remaining) - heading_cost
+            if allowance <= 0:
+                continue
+            taken, used, cut = _take(rest, allowance)
+            if not taken:
+                continue
+            granted[position].extend(taken)
+            spent[position] += used + heading_cost
+            remaining -= used + heading_cost
+            if cut:
+                finished.add(position)
+
+    blocks = []
+    kept = []
+    for position, (name, heading, _) in enumerate(sections):
+        if not granted[position]:
+            continue
+        kept.append(name)
+        blocks.append("\n".join(([heading] if heading else []) + granted[position]))
+    compacted = "\n\n".join(blocks)
+
+    compacted_tokens = estimate_text_tokens(compacted)
+    return {
+        "text": compacted,
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "compression_ratio": round(original_tokens / compacted_tokens, 2) if compacted_tokens else 1.0,
+        "sections": kept
+    }
+
+
+class Compactor:
+    """compact_resume with running totals for /extraction-stats"""
+
+    def __init__(self, token_budget=RESUME_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.lock = threading.Lock()
+        self.resumes = 0
+        self.original_tokens = 0
+        self.compacted_tokens = 0
+
+    def compact(self, text):
+        compaction = compact_resume(text, self.token_budget)
+        with self.lock:
+            self.resumes += 1
+            self.original_tokens += compaction["original_tokens"]
+            self.compacted_tokens += compaction["compacted_tokens"]
+        return compaction
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "token_budget": self.token_budget,
+                "resumes": self.resumes,
+                "original_tokens": self.original_tokens,
+                "compacted_tokens": self.compacted_tokens,
+                "compression_ratio": round(self.original_tokens / self.compacted_tokens, 2)
+                if self.compacted_tokens else None
+            }
@@ -0,0 +1,527 @@
+"""
+Gemini client helpers - keep LLM calls off the event loop
+Uses the SDK's async client and caps how many Gemini calls are in flight per worker.
+ModelPool adds per-model timeouts, retries with jittered backoff, a circuit breaker
+per model and optional hedged requests for tail latency. Replies can also be streamed
+chunk by chunk with generate_stream.
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import aclosing
+
+from rate_limiter import RateLimited, estimate_tokens, get_admission_controller
+from metrics import (
+    LLM_CALLS,
+    LLM_CIRCUIT_OPEN,
+    LLM_HEDGED_REQUESTS,
+    LLM_IN_FLIGHT,
+    LLM_RETRIES,
+    LLM_TOKENS,
+    STAGE_LATENCY
+)
+
+# Maximum number of Gemini calls in flight at once (per worker process)
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "32"))
+
+# Models tried in order, as "name" or "name:timeout_seconds"
+GEMINI_MODELS = os.getenv("GEMINI_MODELS", "gemini-1.5-flash,gemini-1.0-pro")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+# Consecutive failures that open a model's circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Hedged requests: send a backup call once the first is slower than the model's p95
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+# Latency samples needed before a model's p95 is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+
+# HTTP status codes worth retrying - rate limits and upstream trouble
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Status codes saying this model can't serve anyone (not found, no access) - the next model may
+MODEL_ERROR_STATUS_CODES = {403, 404}
+
+# Set by the app when usage tracking is enabled - every call is recorded with its real token counts
+usage_monitor = None
+
+_semaphore = None
+_in_flight = 0
+
+
+class ModelUnavailable(Exception):
+    """Raised when every model in the pool has an open circuit"""
+
+
+def _get_semaphore():
+    """Create the limiter lazily so it binds to the running event loop"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+    return _semaphore
+
+
+def model_label(model):
+    """Short model name for metrics, e.g. 'gemini-1.5-flash'"""
+    return str(getattr(model, "model_name", "unknown")).split("/")[-1]
+
+
+def token_counts(response):
+    """(prompt tokens, response tokens) as reported by Gemini, or (0, 0) if missing"""
+    usage = getattr(response, "usage_metadata", None)
+    return (
+        getattr(usage, "prompt_token_count", 0) or 0,
+        getattr(usage, "candidates_token_count", 0) or 0
+    )
+
+
+def record_usage(model_name, response):
+    """Feed a finished response's token counts into metrics and the usage monitor"""
+    tokens_in, tokens_out = token_counts(response)
+    LLM_TOKENS.inc(tokens_in, model=model_name, direction="input")
+    LLM_TOKENS.inc(tokens_out, model=model_name, direction="output")
+    if usage_monitor:
+        usage_monitor.track_request(tokens_in=tokens_in, tokens_out=tokens_out)
+    return tokens_in + tokens_out
+
+
+def _status_code(error):
+    """HTTP status of an upstream error (google.api_core exceptions carry one), else None"""
+    try:
+        return int(getattr(error, "code", None))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error):
+    """
+    Timeouts, connection and transport errors, rate limits and 5xx are retried.
+    Bad requests, local admission rejections and bugs on our side are not.
+    """
+    if isinstance(error, RateLimited):
+        return False
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = _status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    # Failures below HTTP carry no status: google.api_core's RetryError, google.auth's TransportError
+    module = type(error).__module__
+    return module.startswith("google.api_core") or (
+        module.startswith("google.auth") and type(error).__name__ == "TransportError"
+    )
+
+
+def is_model_error(error):
+    """The model itself is unusable (404 not found, 403 no access) - fail over instead of giving up"""
+    return _status_code(error) in MODEL_ERROR_STATUS_CODES
+
+
+async def call_model(model, prompt, timeout=None, **kwargs):
+    """
+    One Gemini call with a timeout, recorded in metrics and usage tracking.
+
+    The call first has to be admitted by the model's RPM/TPM token buckets and
+    raises RateLimited if no capacity frees up within ADMISSION_MAX_WAIT.
+    """
+    global _in_flight
+    model_name = model_label(model)
+    admission = get_admission_controller(model_name)
+    estimated_tokens = await admission.acquire(estimate_tokens(prompt))
+    _in_flight += 1
+    LLM_IN_FLIGHT.inc(model=model_name)
+    start = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(model.generate_content_async(prompt, **kwargs), timeout)
+    except asyncio.CancelledError:
+        LLM_CALLS.inc(model=model_name, outcome="cancelled")
+        raise
+    except Exception:
+        LLM_CALLS.inc(model=model_name, outcome="error")
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="llm_call", model=model_name)
+        LLM_IN_FLIGHT.dec(model=model_name)
+        _in_flight -= 1
+
+    LLM_CALLS.inc(model=model_name, outcome="success")
+    admission.settle(estimated_tokens, record_usage(model_name, response))
+    return response
+
+
+async def stream_model(model, prompt, timeout=None, **kwargs):
+    """
+    call_model for a streamed reply - an async generator of text chunks.
+
+    Admission, metrics and usage tracking work as in call_model. timeout covers the
+    whole stream, and the wait for the first chunk is recorded as the llm_first_chunk stage.
+    """
+    global _in_flight
+    model_name = model_label(model)
+    admission = get_admission_controller(model_name)
+    estimated_tokens = await admission.acquire(estimate_tokens(prompt))
+    _in_flight += 1
+    LLM_IN_FLIGHT.inc(model=model_name)
+    start = time.perf_counter()
+    deadline = None if timeout is None else start + timeout
+    try:
+        response = await asyncio.wait_for(model.generate_content_async(prompt, stream=True, **kwargs), timeout)
+        chunks = aiter(response)
+        first = True
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            try:
+                chunk = await asyncio.wait_for(anext(chunks), remaining)
+            except StopAsyncIteration:
+                break
+            if first:
+                STAGE_LATENCY.observe(time.perf_counter() - start, stage="llm_first_chunk", model=model_name)
+                first = False
+            yield chunk.text
+    except (asyncio.CancelledError, GeneratorExit):
+        # Cancelled, or the consumer stopped reading
+        LLM_CALLS.inc(model=model_name, outcome="cancelled")
+        raise
+    except Exception:
+        LLM_CALLS.inc(model=model_name, outcome="error")
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="llm_call", model=model_name)
+        LLM_IN_FLIGHT.dec(model=model_name)
+        _in_flight -= 1
+
+    LLM_CALLS.inc(model=model_name, outcome="success")
+    # Gemini reports usage on the response once the stream has been read to the end
+    admission.settle(estimated_tokens, record_usage(model_name, response))
+
+
+def configured_models(spec=GEMINI_MODELS):
+    """[(name, timeout_seconds), ...] from a "name[:timeout],..." spec"""
+    models = []
+    for item in spec.split(","):
+        name, _, timeout = item.strip().partition(":")
+        if name:
+            models.append((name, float(timeout or LLM_TIMEOUT)))
+    return models
+
+
+class CircuitBreaker:
+    """Stops sending traffic to a model after repeated failures, then lets one trial call through"""
+
+    def __init__(self, name, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        # When the half-open trial call went out - a trial that never reports back
+        # (cancelled, or a non-retryable error) is given up on after reset_seconds
+        self.trial_started_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def _trial_running(self):
+        return self.trial_started_at is not None and time.monotonic() - self.trial_started_at < self.reset_seconds
+
+    def available(self):
+        """Whether allow() would let a call through, without claiming the trial"""
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self._trial_running())
+
+    def allow(self):
+        """Admit a call - while half-open only one, the trial, until it reports back"""
+        if not self.available():
+            return False
+        if self.state == "half-open":
+            self.trial_started_at = time.monotonic()
+        return True
+
+    def release(self):
+        """A call ended without telling us anything about the model's health"""
+        self.trial_started_at = None
+
+    def record_success(self):
+        self.failures = 0
+        self.trial_started_at = None
+        if self.opened_at is not None:
+            self.opened_at = None
+            LLM_CIRCUIT_OPEN.set(0, model=self.name)
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_started_at = None
+        # A failed trial call re-opens the circuit straight away
+        if self.failures >= self.threshold or self.state == "half-open":
+            self.opened_at = time.monotonic()
+            LLM_CIRCUIT_OPEN.set(1, model=self.name)
+
+
+class PooledModel:
+    """One model in the pool with its timeout, circuit breaker and recent latencies"""
+
+    def __init__(self, name, model, timeout=LLM_TIMEOUT):
+        self.name = name
+        self.model = model
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(name)
+        self.latencies = deque(maxlen=200)
+        # Gemini 1.0 models reject JSON mode and response schemas
+        self.supports_json_schema = not name.startswith("gemini-1.0")
+
+    def p95(self):
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def _supported(self, kwargs):
+        if not self.supports_json_schema and "generation_config" in kwargs:
+            # The prompt spells out the JSON format too, so the reply still parses
+            kwargs = dict(kwargs)
+            kwargs.pop("generation_config")
+        return kwargs
+
+    async def call(self, prompt, **kwargs):
+        kwargs = self._supported(kwargs)
+        start = time.perf_counter()
+        try:
+            response = await call_model(self.model, prompt, timeout=self.timeout, **kwargs)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if is_retryable(e) or is_model_error(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+        self.latencies.append(time.perf_counter() - start)
+        self.breaker.record_success()
+        return response
+
+    async def stream(self, prompt, **kwargs):
+        """
+        Streamed call - feeds the circuit breaker like call, but not the latency
+        samples, since a stream's duration includes the time its reader takes
+        """
+        kwargs = self._supported(kwargs)
+        try:
+            async with aclosing(stream_model(self.model, prompt, timeout=self.timeout, **kwargs)) as chunks:
+                async for text in chunks:
+                    yield text
+        except (asyncio.CancelledError, GeneratorExit):
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if is_retryable(e) or is_model_error(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+
+class ModelPool:
+    """
+    Several Gemini models behind one generate_content_async-style interface.
+
+    Models are tried in configured order. Each gets LLM_MAX_RETRIES retries with
+    jittered exponential backoff; repeated failures open its circuit so traffic
+    goes to the next model until it recovers. With hedging on, a backup call is
+    sent once the first has taken longer than the model's p95 latency, and
+    whichever answers first wins.
+    """
+
+    def __init__(self, entries, hedge=LLM_HEDGE_ENABLED):
+        self.entries = entries
+        self.hedge = hedge
+
+    @classmethod
+    def from_config(cls, create_model, spec=GEMINI_MODELS):
+        """Build a pool from "name[:timeout],..." - returns None if no model could be created"""
+        entries = []
+        for name, timeout in configured_models(spec):
+            try:
+                entries.append(PooledModel(name, create_model(name), timeout))
+            except Exception as e:
+                print(f"⚠️  Could not initialize model {name}: {e}")
+        return cls(entries) if entries else None
+
+    @property
+    def model_name(self):
+        return self.entries[0].name
+
+    def _available(self):
+        return [entry for entry in self.entries if entry.breaker.available()]
+
+    async def _hedged_call(self, entry, prompt, kwargs):
+        primary = asyncio.create_task(entry.call(prompt, **kwargs))
+        delay = entry.p95() if self.hedge else None
+        if delay is None:
+            return await primary
+
+        pending = {primary}
+        error = None
+        try:
+            # Inside the try, so the call is cancelled if the caller gives up while waiting
+            done, _ = await asyncio.wait({primary}, timeout=max(delay, LLM_HEDGE_MIN_DELAY))
+            if done:
+                return primary.result()
+
+            # Send the backup to the next model that admits it if there is one, else the same model again
+            backup_entry = next(
+                (other for other in self.entries if other is not entry and other.breaker.allow()), entry
+            )
+            LLM_HEDGED_REQUESTS.inc(model=entry.name)
+            pending.add(asyncio.create_task(backup_entry.call(prompt, **kwargs)))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate_content_async(self, prompt, **kwargs):
+        last_error = None
+        rate_limited = []
+        for entry in self._available():
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                if not entry.breaker.allow():
+                    break
+                try:
+                    return await self._hedged_call(entry, prompt, kwargs)
+                except RateLimited as e:
+                    # This model's quota is full - its neighbour has a quota of its own
+                    rate_limited.append(e)
+                    break
+                except Exception as e:
+                    if is_model_error(e):
+                        # Retrying won't help, but another model might
+                        last_error = e
+                        break
+                    if not is_retryable(e):
+                        raise
+                    last_error = e
+                    if attempt < LLM_MAX_RETRIES:
+                        LLM_RETRIES.inc(model=entry.name)
+                        # Full jitter keeps retries from many requests from lining up
+                        await asyncio.sleep(random.uniform(0, LLM_RETRY_BACKOFF * 2 ** attempt))
+        self._give_up(last_error, rate_limited)
+
+    async def stream_content_async(self, prompt, **kwargs):
+        """
+        generate_content_async for a streamed reply - an async generator of text chunks.
+
+        Failover and retries work as for a whole reply until the first chunk arrives;
+        from then on the reply is committed to that model and errors propagate.
+        Streams are never hedged.
+        """
+        last_error = None
+        rate_limited = []
+        for entry in self._available():
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                if not entry.breaker.allow():
+                    break
+                started = False
+                try:
+                    async with aclosing(entry.stream(prompt, **kwargs)) as chunks:
+                        async for text in chunks:
+                            started = True
+                            yield text
+                    return
+                except RateLimited as e:
+                    rate_limited.append(e)
+                    break
+                except Exception as e:
+                    if not started and is_model_error(e):
+                        last_error = e
+                        break
+                    if started or not is_retryable(e):
+                        raise
+                    last_error = e
+                    if attempt < LLM_MAX_RETRIES:
+                        LLM_RETRIES.inc(model=entry.name)
+                        await asyncio.sleep(random.uniform(0, LLM_RETRY_BACKOFF * 2 ** attempt))
+        self._give_up(last_error, rate_limited)
+
+    @staticmethod
+    def _give_up(last_error, rate_limited):
+        """Raise the error that best describes why no model answered"""
+        if rate_limited:
+            raise min(rate_limited, key=lambda e: e.retry_after)
+        if last_error is not None and getattr(last_error, "code", None) == 429:
+            # Upstream quota errors surface as a proper 429 rather than a generic failure
+            raise RateLimited("Gemini rate limit exceeded - try again shortly", retry_after=30) from last_error
+        if last_error:
+            raise last_error
+        raise ModelUnavailable("All Gemini models are temporarily unavailable - try again shortly")
+
+    async def count_tokens_async(self, contents):
+        """Used by the health probe - checks the first model that isn't tripped"""
+        available = self._available() or self.entries
+        return await available[0].model.count_tokens_async(contents)
+
+    def get_stats(self):
+        return [
+            {
+                "model": entry.name,
+                "timeout_seconds": entry.timeout,
+                "circuit": entry.breaker.state,
+                "consecutive_failures": entry.breaker.failures,
+                "p95_latency_ms": round(entry.p95() * 1000, 1) if entry.p95() is not None else None
+            }
+            for entry in self.entries
+        ]
+
+
+async def generate(model, prompt, **kwargs):
+    """
+    Call Gemini without blocking the event loop.
+
+    Waits for a free slot if MAX_CONCURRENT_LLM_CALLS calls are already running,
+    so a burst of screenings queues here instead of hammering the upstream API.
+    model can be a single model or a ModelPool.
+    """
+    async with _get_semaphore():
+        if isinstance(model, ModelPool):
+            return await model.generate_content_async(prompt, **kwargs)
+        return await call_model(model, prompt, **kwargs)
+
+
+async def generate_stream(model, prompt, **kwargs):
+    """
+    generate for a streamed reply - an async generator of text chunks.
+
+    The concurrency slot is held until the stream has been read to the end or closed.
+    """
+    async with _get_semaphore():
+        if isinstance(model, ModelPool):
+            chunks = model.stream_content_async(prompt, **kwargs)
+        else:
+            chunks = stream_model(model, prompt, **kwargs)
+        async with aclosing(chunks):
+            async for text in chunks:
+                yield text
+
+
+def get_limiter_stats():
+    """Current limiter state, handy for health and info endpoints"""
+    return {
+        "max_concurrent_llm_calls": MAX_CONCURRENT_LLM_CALLS,
+        "llm_calls_in_flight": _in_flight
+    }
@@ -0,0 +1,102 @@
+"""
+Health Probe - check the Gemini API on a schedule instead of on every /health hit
+The latest result is cached with a timestamp, so health endpoints answer instantly
+and load balancer probes never spend API quota
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+# Seconds between upstream probes
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "60"))
+# Seconds before a single probe is counted as failed
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "10"))
+# Number of recent probes used for latency and error rate
+HEALTH_PROBE_WINDOW = int(os.getenv("HEALTH_PROBE_WINDOW", "10"))
+# Error rate over the window above which the instance reports not ready
+HEALTH_MAX_ERROR_RATE = float(os.getenv("HEALTH_MAX_ERROR_RATE", "0.5"))
+
+
+class HealthProbe:
+    def __init__(self, interval=HEALTH_PROBE_INTERVAL, timeout=HEALTH_PROBE_TIMEOUT, window=HEALTH_PROBE_WINDOW):
+        self.interval = interval
+        self.timeout = timeout
+        self.history = deque(maxlen=window)
+        self.last_checked = None
+        self.last_error = None
+        self.task = None
+
+    async def probe(self, model):
+        """
+        One upstream check. count_tokens exercises the API key and the network
+        path to Gemini without spending generation quota.
+        """
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(model.count_tokens_async("API health check"), self.timeout)
+            self.last_error = None
+            ok = True
+        except Exception as e:
+            self.last_error = str(e) or type(e).__name__
+            ok = False
+        self.history.append((ok, time.perf_counter() - start))
+        self.last_checked = time.time()
+        return ok
+
+    async def _run(self, get_model):
+        while True:
+            try:
+                model = await get_model()
+            except Exception as e:
+                model = None
+                self.last_error = str(e) or type(e).__name__
+            if model is None:
+                # Model could not be built - try again soon, not an interval later
+                await asyncio.sleep(min(1.0, self.interval))
+                continue
+            await self.probe(model)
+            await asyncio.sleep(self.interval)
+
+    def start(self, get_model):
+        """
+        Probe in the background. get_model is awaited for the model (or None) and
+        builds it if nothing has yet, so readiness never waits on a first request.
+        """
+        self.task = asyncio.create_task(self._run(get_model))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def get_status(self):
+        """Cached upstream status - never calls Gemini"""
+        if not self.history:
+            return {"status": "starting", "checked_at": None}
+
+        errors = sum(1 for ok, _ in self.history if not ok)
+        latencies = sorted(latency for ok, latency in self.history if ok)
+        error_rate = errors / len(self.history)
+        last_ok, last_latency = self.history[-1]
+        age = time.time() - self.last_checked
+
+        if not last_ok:
+            status = "error"
+        elif error_rate > HEALTH_MAX_ERROR_RATE or age > 3 * self.interval:
+            status = "degraded"
+        else:
+            status = "healthy"
+
+        return {
+            "status": status,
+            "checked_at": self.last_checked,
+            "age_seconds": round(age, 1),
+            "upstream_latency_ms": round(last_latency * 1000, 1),
+            "upstream_latency_median_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "upstream_error_rate": round(error_rate, 3),
+            "probes": len(self.history),
+            "last_error": self.last_error
+        }
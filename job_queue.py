@@ -0,0 +1,269 @@
+"""
+Screening Job Queue - submit resumes now, collect results later
+Jobs and their files live in a SQLite file, so queued work survives a restart,
+and a pool of background workers drains it through the normal screening pipeline
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "screening_jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Seconds a worker may hold a task before it is considered lost and handed out again
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# Seconds between queue polls when idle
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# Base delay before retrying a failed task (doubles per attempt)
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+
+# Attempts at recording a task's outcome before leaving it to the lease to hand out again
+RECORD_ATTEMPTS = 5
+
+
+class JobQueue:
+    def __init__(self, db_path=JOB_QUEUE_DB):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                job_requirements TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                filename TEXT,
+                pdf BLOB,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_pending ON tasks (status, available_at);
+            CREATE INDEX IF NOT EXISTS tasks_by_job ON tasks (job_id, idx);
+            """
+        )
+        self.wakeup = None
+        self.workers = []
+
+    # --- storage (blocking, called through asyncio.to_thread) ---
+
+    def _submit(self, job_id, job_requirements, uploads):
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute(
+                    "INSERT INTO jobs (id, job_requirements, total, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, job_requirements, len(uploads), now)
+                )
+                # A generator, so spooled uploads are read into memory one at a time
+                self.db.executemany(
+                    "INSERT INTO tasks (job_id, idx, filename, pdf, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (job_id, index, filename, pdf_content.read() if hasattr(pdf_content, "read") else pdf_content, now)
+                        for index, (filename, pdf_content) in enumerate(uploads)
+                    )
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+                raise
+
+    def _claim(self):
+        """Lease the oldest runnable task - queued, or running with an expired lease"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                # Tasks whose workers keep dying on them are given up on
+                self.db.execute(
+                    "UPDATE tasks SET status = 'failed', error = 'Task lease expired too many times',"
+                    " pdf = NULL, updated_at = ?"
+                    " WHERE status = 'running' AND available_at <= ? AND attempts >= ?",
+                    (now, now, JOB_MAX_ATTEMPTS)
+                )
+                row = self.db.execute(
+                    "SELECT tasks.id, tasks.pdf, jobs.job_requirements, tasks.filename FROM tasks"
+                    " JOIN jobs ON jobs.id = tasks.job_id"
+                    " WHERE (tasks.status = 'queued' AND tasks.available_at <= ?)"
+                    " OR (tasks.status = 'running' AND tasks.available_at <= ?)"
+                    " ORDER BY tasks.id LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row:
+                    self.db.execute(
+                        "UPDATE tasks SET status = 'running', attempts = attempts + 1,"
+                        " available_at = ?, updated_at = ? WHERE id = ?",
+                        (now + JOB_LEASE_SECONDS, now, row[0])
+                    )
+                self.db.execute("COMMIT")
+            except Exception:
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, task_id, result=None, error=None, retry_after=0, retry=True):
+        """Record a task's outcome, re-queueing a retryable failure with backoff if attempts remain"""
+        now = time.time()
+        with self.lock:
+            if error is None:
+                self.db.execute(
+                    "UPDATE tasks SET status = 'done', result = ?, error = NULL, pdf = NULL,"
+                    " updated_at = ? WHERE id = ?",
+                    (json.dumps(result), now, task_id)
+                )
+                return
+            attempts = self.db.execute(
+                "SELECT attempts FROM tasks WHERE id = ?", (task_id,)
+            ).fetchone()[0]
+            if retry and attempts < JOB_MAX_ATTEMPTS:
+                self.db.execute(
+                    "UPDATE tasks SET status = 'queued', error = ?, available_at = ?,"
+                    " updated_at = ? WHERE id = ?",
+                    (error, now + max(JOB_RETRY_BACKOFF * 2 ** (attempts - 1), retry_after), now, task_id)
+                )
+            else:
+                self.db.execute(
+                    "UPDATE tasks SET status = 'failed', result = ?, error = ?, pdf = NULL,"
+                    " updated_at = ? WHERE id = ?",
+                    (json.dumps(result) if result else None, error, now, task_id)
+                )
+
+    def _get_job(self, job_id, offset, limit):
+        with self.lock:
+            job = self.db.execute(
+                "SELECT job_requirements, total, created_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if not job:
+                return None
+            counts = dict(self.db.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            rows = self.db.execute(
+                "SELECT idx, filename, status, attempts, result, error FROM tasks"
+                " WHERE job_id = ? AND status IN ('done', 'failed')"
+                " ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+
+        finished = counts.get("done", 0) + counts.get("failed", 0)
+        if finished == job[1]:
+            status = "completed"
+        elif finished or counts.get("running"):
+            status = "running"
+        else:
+            status = "queued"
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "created_at": job[2],
+            "progress": {
+                "total": job[1],
+                "queued": counts.get("queued", 0),
+                "running": counts.get("running", 0),
+                "done": counts.get("done", 0),
+                "failed": counts.get("failed", 0)
+            },
+            "offset": offset,
+            "limit": limit,
+            "results": [
+                {
+                    "index": idx,
+                    "filename": filename,
+                    "status": task_status,
+                    "attempts": attempts,
+                    "result": json.loads(result) if result else None,
+                    "error": error
+                }
+                for idx, filename, task_status, attempts, result, error in rows
+            ]
+        }
+
+    # --- async API ---
+
+    async def submit(self, job_requirements, uploads):
+        """Queue a list of (filename, pdf) for screening and return the job id - pdf is bytes or a spooled upload"""
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._submit, job_id, job_requirements, uploads)
+        if self.wakeup:
+            self.wakeup.set()
+        return job_id
+
+    async def get_job(self, job_id, offset=0, limit=50):
+        """Job progress plus one page of finished results, or None if unknown"""
+        return await asyncio.to_thread(self._get_job, job_id, offset, limit)
+
+    async def _record(self, task_id, result, error, retry_after, retry):
+        """_finish, retried with backoff - a locked database mustn't lose a paid-for result"""
+        for attempt in range(RECORD_ATTEMPTS):
+            try:
+                await asyncio.to_thread(self._finish, task_id, result, error, retry_after, retry)
+                return
+            except Exception as e:
+                print(f"⚠️  Could not record job task {task_id}: {e}")
+                await asyncio.sleep(JOB_POLL_INTERVAL * 2 ** attempt)
+        # Still marked running - the task is handed out again once its lease expires
+
+    async def _worker(self, screen_fn):
+        while True:
+            try:
+                task = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                # e.g. another worker process holding the write lock past busy_timeout
+                print(f"⚠️  Job queue claim failed: {e}")
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+            if task is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task_id, pdf_content, job_requirements, filename = task
+            retry_after = 0
+            try:
+                result = await screen_fn(pdf_content, job_requirements, filename)
+                error = result.get("error") if isinstance(result, dict) else None
+                # An error result (unreadable PDF, no model) would come out the same next time
+                retry = False
+            except Exception as e:
+                result, error = None, str(e)
+                # Raised errors, such as RateLimited, may clear up - retried with backoff,
+                # waiting at least as long as the limiter asked
+                retry_after = getattr(e, "retry_after", 0)
+                retry = True
+            await self._record(task_id, result, str(error) if error else None, retry_after, retry)
+
+    def start(self, screen_fn, workers=JOB_WORKERS):
+        """Start background workers that screen tasks with screen_fn(pdf_bytes, job_requirements, filename)"""
+        self.wakeup = asyncio.Event()
+        self.workers = [asyncio.create_task(self._worker(screen_fn)) for _ in range(workers)]
+
+    async def stop(self):
+        """Stop the workers - any task they held is picked up again once its lease expires"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
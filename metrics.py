@@ -0,0 +1,176 @@
+"""
+Metrics - Prometheus-style counters, gauges and latency histograms
+Served as plain text from /metrics so any Prometheus scraper can collect them
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds - from fast cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY = []
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][position] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, entry in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, entry["buckets"]):
+                    labels = _format_labels(self.label_names, key, ("le", f"{bound:g}"))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{labels} {entry['count']}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {entry['sum']}")
+                lines.append(f"{self.name}_count{labels} {entry['count']}")
+        return lines
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter(
+    "resume_screener_http_requests_total", "HTTP requests handled", ("method", "path", "status")
+)
+HTTP_IN_FLIGHT = Gauge(
+    "resume_screener_http_requests_in_flight", "HTTP requests currently being handled"
+)
+HTTP_LATENCY = Histogram(
+    "resume_screener_http_request_duration_seconds", "HTTP request latency", ("method", "path")
+)
+STAGE_LATENCY = Histogram(
+    "resume_screener_stage_duration_seconds",
+    "Latency of each screening stage (upload_read, pdf_extraction, compaction, llm_call, llm_first_chunk, json_parse)",
+    ("stage", "model")
+)
+LLM_CALLS = Counter(
+    "resume_screener_llm_calls_total", "Gemini calls by outcome", ("model", "outcome")
+)
+LLM_IN_FLIGHT = Gauge(
+    "resume_screener_llm_calls_in_flight", "Gemini calls currently waiting on the API", ("model",)
+)
+LLM_TOKENS = Counter(
+    "resume_screener_llm_tokens_total", "Tokens reported by Gemini", ("model", "direction")
+)
+LLM_RETRIES = Counter(
+    "resume_screener_llm_retries_total", "Gemini calls retried after a timeout or upstream error", ("model",)
+)
+LLM_HEDGED_REQUESTS = Counter(
+    "resume_screener_llm_hedged_requests_total", "Backup Gemini calls sent because the first was slow", ("model",)
+)
+LLM_CIRCUIT_OPEN = Gauge(
+    "resume_screener_llm_circuit_open", "1 while a model's circuit breaker is open", ("model",)
+)
+COMPRESSION_RATIO = Histogram(
+    "resume_screener_resume_compression_ratio",
+    "Extracted resume tokens divided by the tokens kept after compaction",
+    buckets=(1.0, 1.25, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0, 12.0, 16.0)
+)
+PARSE_OUTCOMES = Counter(
+    "resume_screener_parse_outcomes_total", "Gemini replies parsed cleanly, repaired or failed", ("outcome",)
+)
+TIER_DECISIONS = Counter(
+    "resume_screener_tier_decisions_total",
+    "Screenings decided by the first-pass model, the escalation model, or the first pass after a failed escalation",
+    ("tier",)
+)
+NEAR_DUPLICATES = Counter(
+    "resume_screener_near_duplicates_total",
+    "Resumes answered with a near-duplicate's screening, from the same batch or a recent one",
+    ("scope",)
+)
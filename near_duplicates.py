@@ -0,0 +1,219 @@
+"""
+Near-Duplicate Detection - screen one copy of a resume, not every re-export of it
+Extracted text is reduced to a MinHash signature over word shingles (NumPy) and indexed
+with LSH banding, so resumes that differ by a re-export or an edited line are found
+without comparing every pair. Exact byte hashes already catch identical uploads; this
+catches the ones that are almost identical
+"""
+
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() == "true"
+# Estimated Jaccard similarity of word shingles at which two resumes count as one (0.0 - 1.0)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Signatures of recently screened resumes kept per worker for matching later batches
+NEAR_DUPLICATE_RECENT = int(os.getenv("NEAR_DUPLICATE_RECENT", "10000"))
+
+# Hash functions per signature, and words per shingle
+NUM_PERMUTATIONS = 128
+SHINGLE_WORDS = 3
+# Resumes with fewer words than this (e.g. scans without a text layer) are never matched
+MIN_WORDS = 50
+# Chance that a pair exactly at the threshold shares at least one LSH band
+LSH_RECALL = 0.99
+
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+# Largest prime below 2**32 - keeps a * x + b inside uint64 for 32-bit shingle hashes
+HASH_PRIME = 4294967291
+
+_permutations = None
+
+
+def _get_permutations():
+    # Imported on first use so it doesn't add to app start-up time
+    import numpy as np
+
+    global _permutations
+    if _permutations is None:
+        # Fixed seed - signatures must compare equal across workers and restarts
+        rng = np.random.default_rng(20240101)
+        a = rng.integers(1, HASH_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+        b = rng.integers(0, HASH_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+        _permutations = a, b
+    return _permutations
+
+
+def signature(text):
+    """
+    MinHash signature of a resume's extracted text.
+
+    Returns a uint32 array of NUM_PERMUTATIONS values, or None when the text is too
+    short to tell one resume from another.
+    """
+    import numpy as np
+
+    words = WORD_PATTERN.findall((text or "").lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {
+        " ".join(words[start:start + SHINGLE_WORDS])
+        for start in range(len(words) - SHINGLE_WORDS + 1)
+    }
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64)
+    a, b = _get_permutations()
+    return ((hashes[:, None] * a + b) % HASH_PRIME).min(axis=0).astype(np.uint32)
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return float((first == second).mean())
+
+
+def lsh_shape(threshold, num_permutations=NUM_PERMUTATIONS, recall=LSH_RECALL):
+    """
+    (bands, rows) for LSH banding: the most rows per band, so the fewest false
+    candidates, that still puts a pair at the threshold in a shared band with
+    probability recall. Candidates are then checked against the threshold exactly.
+    """
+    for rows in range(num_permutations, 0, -1):
+        bands = num_permutations // rows
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_permutations, 1
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of MinHash signatures, keyed by whatever identifies each resume.
+
+    capacity bounds the number of signatures kept (oldest dropped first, 0 = no
+    limit); a filename can be stored with each one for reporting matches.
+    """
+
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD, capacity=NEAR_DUPLICATE_RECENT):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.bands, self.rows = lsh_shape(threshold)
+        self.entries = OrderedDict()
+        self.buckets = [defaultdict(set) for _ in range(self.bands)]
+        self.hits = 0
+        self.lookups = 0
+        self.lock = threading.Lock()
+
+    def _band_keys(self, resume_signature):
+        return [
+            resume_signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def add(self, key, resume_signature, filename=None):
+        if resume_signature is None:
+            return
+        band_keys = self._band_keys(resume_signature)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = (resume_signature, filename, band_keys)
+            for bucket, band_key in zip(self.buckets, band_keys):
+                bucket[band_key].add(key)
+            while self.capacity and len(self.entries) > self.capacity:
+                self._evict(next(iter(self.entries)))
+
+    def _evict(self, key):
+        _, _, band_keys = self.entries.pop(key)
+        for bucket, band_key in zip(self.buckets, band_keys):
+            keys = bucket[band_key]
+            keys.discard(key)
+            if not keys:
+                del bucket[band_key]
+
+    def query(self, resume_signature):
+        """
+        Indexed resumes at or above the threshold, most similar first.
+
+        Returns a list of (key, filename, similarity).
+        """
+        if resume_signature is None:
+            return []
+        band_keys = self._band_keys(resume_signature)
+        with self.lock:
+            self.lookups += 1
+            candidates = set()
+            for bucket, band_key in zip(self.buckets, band_keys):
+                candidates.update(bucket.get(band_key, ()))
+            matches = []
+            for key in candidates:
+                indexed_signature, filename, _ = self.entries[key]
+                score = similarity(resume_signature, indexed_signature)
+                if score >= self.threshold:
+                    matches.append((key, filename, score))
+            if matches:
+                self.hits += 1
+        matches.sort(key=lambda match: -match[2])
+        return matches
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "enabled": True,
+                "threshold": self.threshold,
+                "indexed": len(self.entries),
+                "capacity": self.capacity,
+                "lsh_bands": self.bands,
+                "lsh_rows": self.rows,
+                "lookups": self.lookups,
+                "hits": self.hits
+            }
+
+
+def group_near_duplicates(signatures, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Group a batch in order: each resume joins the most similar earlier representative
+    at or above the threshold, or becomes a representative itself.
+
+    Returns, per position, None for representatives and (representative position,
+    similarity) for the rest. None signatures are always representatives.
+    """
+    index = NearDuplicateIndex(threshold, capacity=0)
+    groups = []
+    for position, resume_signature in enumerate(signatures):
+        matches = index.query(resume_signature)
+        if matches:
+            representative, _, score = matches[0]
+            groups.append((representative, score))
+        else:
+            index.add(position, resume_signature)
+            groups.append(None)
+    return groups
+
+
+def near_duplicate_result(result, **origin):
+    """A copy of result for a resume that wasn't screened itself, saying whose it is"""
+    return {**result, "near_duplicate_of": origin}
+
+
+def with_near_duplicates(items, followers):
+    """
+    Result items plus one for every follower of the resumes in them (see
+    Screener.dedup_uploads), carrying its representative's result
+    """
+    expanded = list(items)
+    for item in items:
+        for index, filename, score in followers.get(item["index"], ()):
+            expanded.append({
+                "index": index,
+                "filename": filename,
+                "result": near_duplicate_result(
+                    item["result"], index=item["index"], filename=item["filename"], similarity=score
+                )
+            })
+    return expanded
@@ -0,0 +1,245 @@
+"""
+PDF Text Extraction - parse resumes in a process pool, off the request path
+PyPDF2 is pure Python and holds the GIL, so parsing runs in worker processes
+sized to the machine, with a per-job timeout and a cache of extracted text. Jobs wait
+for a free worker before they are submitted, so only parsing time counts towards the
+timeout, and a runaway parse is killed without taking its neighbours' jobs with it.
+Spooled uploads are handed over by path and parsed from a memory map, so the PDF is
+never pickled across to the worker or copied into memory
+"""
+
+import asyncio
+import io
+import mmap
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from result_cache import content_hash
+
+# Worker processes serving the app - the machine's cores are split between their pools
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Number of extraction processes per app worker (0 = extract in a thread instead)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+# Seconds before a parse is considered runaway and its worker is killed
+PDF_EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", "20"))
+# Characters of raw text extracted per resume - compaction then picks what fits the token budget
+RESUME_CHAR_BUDGET = int(os.getenv("RESUME_CHAR_BUDGET", "12000"))
+PDF_TEXT_CACHE_MAX_BYTES = int(os.getenv("PDF_TEXT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+class PdfExtractionTimeout(Exception):
+    """Raised when a PDF takes longer than PDF_EXTRACT_TIMEOUT to parse"""
+
+
+def extract_text(pdf_content, char_budget=RESUME_CHAR_BUDGET):
+    """
+    Extract text page by page until char_budget characters are collected
+    (runs inside a worker process).
+
+    Pages past the budget would be cut from the prompt anyway, so they are
+    never parsed - a 40-page CV costs about as much as a 2-page one. Pages are
+    separated by form feeds so compaction can spot running headers and footers.
+    """
+    import PyPDF2
+
+    stream = pdf_content if hasattr(pdf_content, "read") else io.BytesIO(pdf_content)
+    pdf_file = PyPDF2.PdfReader(stream)
+    pages_total = len(pdf_file.pages)
+    chunks = []
+    collected = 0
+    pages_parsed = 0
+    for page in pdf_file.pages:
+        if collected >= char_budget:
+            break
+        page_text = page.extract_text() or ""
+        chunks.append(page_text)
+        collected += len(page_text)
+        pages_parsed += 1
+
+    return {
+        "text": "\f".join(chunks)[:char_budget],
+        "pages_parsed": pages_parsed,
+        "pages_skipped": pages_total - pages_parsed
+    }
+
+
+def extract_text_file(path, char_budget=RESUME_CHAR_BUDGET):
+    """extract_text for a PDF on disk, read through a memory map rather than into memory"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap refuses empty files - let PyPDF2 report it like any other bad PDF
+            return extract_text(b"", char_budget)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return extract_text(view, char_budget)
+
+
+class TextCache:
+    """Size-bounded LRU of extraction results, keyed by the PDF's content hash"""
+
+    def __init__(self, max_bytes=PDF_TEXT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            extraction = self.entries.get(key)
+            if extraction is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return extraction
+
+    def set(self, key, extraction):
+        size = len(extraction["text"])
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key)["text"])
+            if size > self.max_bytes:
+                return
+            self.entries[key] = extraction
+            self.size += size
+            while self.size > self.max_bytes:
+                _, oldest = self.entries.popitem(last=False)
+                self.size -= len(oldest["text"])
+
+
+class PdfExtractor:
+    def __init__(self, workers=PDF_WORKERS, timeout=PDF_EXTRACT_TIMEOUT, char_budget=RESUME_CHAR_BUDGET):
+        self.workers = workers
+        self.timeout = timeout
+        self.char_budget = char_budget
+        self.text_cache = TextCache()
+        self.pool = None
+        # Jobs submitted to each pool and not yet finished or timed out
+        self.running = Counter()
+        # Pools with a runaway parse, killed once their other jobs are done
+        self.retiring = set()
+        self.slots = None
+        self.queued = 0
+        self.timeouts = 0
+        self.pages_parsed = 0
+        self.pages_skipped = 0
+
+    def _get_pool(self):
+        """Start the worker processes on first use"""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self.pool
+
+    def _get_slots(self):
+        """One slot per worker process - created lazily so it binds to the running loop"""
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.workers)
+        return self.slots
+
+    def _retire_pool(self, pool):
+        """Send new jobs to a fresh pool and kill this one, with its runaway parse, once idle"""
+        if self.pool is pool:
+            self.pool = None
+        self.retiring.add(pool)
+        self._reap(pool)
+
+    def _reap(self, pool):
+        if pool not in self.retiring or self.running[pool]:
+            return
+        self.retiring.discard(pool)
+        del self.running[pool]
+        # ProcessPoolExecutor can't cancel a running job, so terminate its workers
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, pdf_content):
+        loop = asyncio.get_running_loop()
+        # Spooled uploads (uploads.PdfUpload) are parsed from their file
+        path = getattr(pdf_content, "path", None)
+        extract, source = (extract_text_file, path) if path else (extract_text, pdf_content)
+        if self.workers <= 0:
+            return await asyncio.wait_for(
+                asyncio.to_thread(extract, source, self.char_budget), self.timeout
+            )
+
+        # Wait for a free worker here rather than in the pool's queue, so the timeout
+        # starts when parsing does
+        self.queued += 1
+        try:
+            await self._get_slots().acquire()
+        finally:
+            self.queued -= 1
+        try:
+            pool = self._get_pool()
+            self.running[pool] += 1
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(pool, extract, source, self.char_budget),
+                    self.timeout
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._retire_pool(pool)
+                raise PdfExtractionTimeout(
+                    f"PDF parsing took longer than {self.timeout:g} seconds"
+                )
+            except BrokenProcessPool:
+                if self.pool is pool:
+                    self.pool = None
+                raise
+            finally:
+                self.running[pool] -= 1
+                self._reap(pool)
+        finally:
+            self.slots.release()
+
+    async def extract(self, pdf_content):
+        """
+        Extract up to char_budget characters of text from a PDF (bytes or a spooled upload).
+
+        Returns a dict with the text plus how many pages were parsed and skipped.
+        Results come from the cache when this exact file was seen before.
+        """
+        key = f"{content_hash(pdf_content)}:{self.char_budget}"
+        extraction = self.text_cache.get(key)
+        if extraction is not None:
+            return extraction
+
+        try:
+            extraction = await self._run(pdf_content)
+        except BrokenProcessPool:
+            # A worker process died (e.g. out of memory) - try once more in a fresh pool
+            extraction = await self._run(pdf_content)
+
+        self.pages_parsed += extraction["pages_parsed"]
+        self.pages_skipped += extraction["pages_skipped"]
+        self.text_cache.set(key, extraction)
+        return extraction
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        for pool in list(self.retiring):
+            self.running[pool] = 0
+            self._reap(pool)
+
+    def get_stats(self):
+        return {
+            "workers": self.workers,
+            "timeout_seconds": self.timeout,
+            "queued": self.queued,
+            "timeouts": self.timeouts,
+            "char_budget": self.char_budget,
+            "pages_parsed": self.pages_parsed,
+            "pages_skipped": self.pages_skipped,
+            "text_cache_hits": self.text_cache.hits,
+            "text_cache_misses": self.text_cache.misses,
+            "text_cache_bytes": self.text_cache.size
+        }
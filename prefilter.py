@@ -0,0 +1,101 @@
+"""
+Lexical Pre-Filter - rank a batch of resumes locally before paying for Gemini
+Scores extracted resume text against the job requirements with BM25 (NumPy),
+so only the most relevant candidates are sent for AI screening
+"""
+
+import os
+import re
+from collections import Counter
+
+
+# Candidates sent to Gemini per batch (0 = no limit)
+PREFILTER_TOP_K = int(os.getenv("PREFILTER_TOP_K", "20"))
+# Minimum lexical score, relative to the best resume in the batch (0.0 - 1.0)
+PREFILTER_MIN_SCORE = float(os.getenv("PREFILTER_MIN_SCORE", "0.0"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have",
+    "in", "is", "it", "of", "on", "or", "our", "that", "the", "their", "this", "to",
+    "we", "will", "with", "you", "your", "years", "experience", "looking", "must",
+    "should", "strong", "plus", "work", "working", "ability"
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+
+def tokenize(text):
+    """Lowercase word tokens, keeping things like c++ and c# intact"""
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOPWORDS]
+
+
+def bm25_scores(resume_texts, job_requirements, k1=BM25_K1, b=BM25_B):
+    """
+    BM25 score of every resume against the job requirements.
+
+    IDF is computed over the batch itself, so terms every applicant mentions
+    count for little and rarer matching skills dominate the ranking.
+    """
+    # Imported on first use so it doesn't add to app start-up time
+    import numpy as np
+
+    query_terms = sorted(set(tokenize(job_requirements)))
+    if not resume_texts or not query_terms:
+        return np.zeros(len(resume_texts))
+
+    term_index = {term: column for column, term in enumerate(query_terms)}
+    term_freqs = np.zeros((len(resume_texts), len(query_terms)))
+    doc_lengths = np.zeros(len(resume_texts))
+    for row, text in enumerate(resume_texts):
+        tokens = tokenize(text)
+        doc_lengths[row] = len(tokens)
+        for term, count in Counter(tokens).items():
+            column = term_index.get(term)
+            if column is not None:
+                term_freqs[row, column] = count
+
+    doc_count = len(resume_texts)
+    doc_freqs = np.count_nonzero(term_freqs, axis=0)
+    idf = np.log(1 + (doc_count - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+    avg_length = doc_lengths.mean() or 1.0
+    length_norm = k1 * (1 - b + b * doc_lengths / avg_length)
+    weights = term_freqs * (k1 + 1) / (term_freqs + length_norm[:, None])
+    return weights @ idf
+
+
+def shortlist(resume_texts, job_requirements, top_k=PREFILTER_TOP_K, min_score=PREFILTER_MIN_SCORE):
+    """
+    Rank a batch and pick who goes on to Gemini.
+
+    Returns (scores, ranks, selected): scores normalized so the best resume is 1.0,
+    1-based ranks, and a boolean mask of candidates inside top_k and at or above
+    min_score.
+    """
+    import numpy as np
+
+    raw_scores = bm25_scores(resume_texts, job_requirements)
+    best = raw_scores.max() if len(raw_scores) else 0.0
+    scores = raw_scores / best if best > 0 else raw_scores
+
+    order = np.argsort(-scores, kind="stable")
+    ranks = np.empty(len(scores), dtype=int)
+    ranks[order] = np.arange(1, len(scores) + 1)
+
+    selected = scores >= min_score
+    if top_k > 0:
+        selected &= ranks <= top_k
+    return scores, ranks, selected
+
+
+def prefiltered_result(score, rank):
+    """Placeholder result for a candidate that was not sent to Gemini"""
+    return {
+        "prefiltered": True,
+        "lexical_score": round(float(score), 4),
+        "lexical_rank": int(rank),
+        "summary": "Not sent for AI screening - low keyword overlap with the job requirements compared to the rest of the batch."
+    }
@@ -0,0 +1,118 @@
+"""
+Screening Prompts - the prompts sent to Gemini and the JSON schemas their replies must follow
+"""
+
+# Bump whenever a prompt or result format changes so stale cached results are ignored
+PROMPT_VERSION = "3"
+PACKED_PROMPT_VERSION = "packed-3"
+
+DEFAULT_REQUIREMENTS = "General screening - look for red flags and strengths"
+
+
+# Response schemas for Gemini's structured output (JSON mode)
+RESULT_PROPERTIES = {
+    "score": {"type": "integer", "description": "Overall score from 1 to 10"},
+    "summary": {"type": "string", "description": "2-sentence summary of the candidate"},
+    "strengths": {"type": "array", "items": {"type": "string"}},
+    "concerns": {"type": "array", "items": {"type": "string"}},
+    "match_percentage": {"type": "integer", "description": "Match with the requirements from 0 to 100"}
+}
+RESULT_REQUIRED = ["score", "summary", "strengths", "concerns", "match_percentage"]
+
+SCREENING_SCHEMA = {
+    "type": "object",
+    "properties": RESULT_PROPERTIES,
+    "required": RESULT_REQUIRED
+}
+
+PACKED_SCREENING_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"candidate": {"type": "integer"}, **RESULT_PROPERTIES},
+        "required": ["candidate"] + RESULT_REQUIRED
+    }
+}
+
+SCREENING_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": SCREENING_SCHEMA
+}
+
+PACKED_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": PACKED_SCREENING_SCHEMA
+}
+
+
+def build_screening_prompt(resume_text, job_requirements):
+    """Prompt for screening a single resume"""
+    return f"""
+        You are an expert resume screener. Analyze this resume against the job requirements.
+
+        Resume: {resume_text}
+
+        Job Requirements: {job_requirements if job_requirements else DEFAULT_REQUIREMENTS}
+
+        Provide your analysis in EXACTLY this JSON format (no markdown, just pure JSON):
+        {{
+            "score": <integer from 1-10>,
+            "summary": "<2-sentence summary of the candidate>",
+            "strengths": ["<strength1>", "<strength2>", "<strength3>"],
+            "concerns": ["<concern1>", "<concern2>"],
+            "match_percentage": <integer from 0-100>
+        }}
+
+        Be harsh but fair. Look for real experience, not just keywords.
+        Only return the JSON, nothing else.
+        """
+
+
+def build_packed_prompt(resume_texts, job_requirements):
+    """
+    Prompt for screening several resumes in one call.
+
+    The job requirements and instructions are sent once for the whole group;
+    each resume is numbered so the reply can be mapped back to its file.
+    """
+    resumes = "\n\n".join(
+        f"=== Candidate {number} ===\n{resume_text}"
+        for number, resume_text in enumerate(resume_texts, start=1)
+    )
+    return f"""
+        You are an expert resume screener. Analyze each of the {len(resume_texts)} resumes below
+        independently against the same job requirements.
+
+        Job Requirements: {job_requirements if job_requirements else DEFAULT_REQUIREMENTS}
+
+        {resumes}
+
+        Provide your analysis as a JSON array with EXACTLY one object per candidate
+        (no markdown, just pure JSON):
+        [
+            {{
+                "candidate": <candidate number>,
+                "score": <integer from 1-10>,
+                "summary": "<2-sentence summary of the candidate>",
+                "strengths": ["<strength1>", "<strength2>", "<strength3>"],
+                "concerns": ["<concern1>", "<concern2>"],
+                "match_percentage": <integer from 0-100>
+            }}
+        ]
+
+        Be harsh but fair. Look for real experience, not just keywords.
+        Judge every candidate on their own resume only.
+        Only return the JSON array, nothing else.
+        """
+
+
+def clean_response_text(response_text):
+    """Strip the markdown fences Gemini sometimes wraps around JSON"""
+    response_text = response_text.strip()
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    return response_text.strip()
@@ -0,0 +1,273 @@
+"""
+Admission Control - keep Gemini traffic inside its per-minute quotas
+Token buckets for requests per minute and tokens per minute sit in front of every
+Gemini call. Calls wait (up to ADMISSION_MAX_WAIT) for capacity, and beyond that are
+shed with RateLimited so the API can answer 429 with Retry-After instead of
+bursting into upstream errors. With several worker processes the buckets live in a
+shared SQLite file, so all workers draw from the one quota Gemini enforces
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Per-model quotas (0 disables that limit)
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+# Longest a call may wait for capacity before it is rejected
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+# Response tokens assumed when reserving TPM capacity, corrected once the real count is known
+EXPECTED_OUTPUT_TOKENS = 300
+
+# Worker processes serving the app (uvicorn --workers)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# SQLite file the token buckets are kept in, shared by every worker process. Empty keeps
+# them in process memory, which is only right for a single worker
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "rate_limits.db" if WEB_CONCURRENCY > 1 else "")
+
+
+class RateLimited(Exception):
+    """Raised when a call can't be admitted within ADMISSION_MAX_WAIT"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def estimate_tokens(prompt):
+    """Rough token count for a prompt (~4 characters per token) plus the expected reply"""
+    return len(str(prompt)) // 4 + EXPECTED_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    """
+    Bucket refilled continuously at rate_per_minute, holding at most one minute of capacity.
+
+    Reservations may take the level below zero; the deficit is how long the caller
+    has to wait, so waiting callers are served in arrival order.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.level = rate_per_minute
+        self.updated = self.clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+
+    def _save(self):
+        pass
+
+    def available(self):
+        self._refill()
+        return self.level
+
+    def wait_time(self, amount):
+        """Seconds until amount would be available"""
+        self._refill()
+        deficit = amount - self.level
+        return max(0.0, deficit / self.rate)
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+        self._save()
+
+    def give_back(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+        self._save()
+
+
+class BucketStore:
+    """SQLite file holding token bucket levels, shared by every worker process"""
+
+    def __init__(self, db_path=RATE_LIMIT_DB):
+        self.db_path = db_path
+        # Reentrant - buckets read their row under it, inside a transaction or not
+        self.lock = threading.RLock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY,"
+            " level REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+
+    @contextmanager
+    def transaction(self):
+        """IMMEDIATE takes the write lock up front, so check-and-take is atomic across processes"""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                if self.db.in_transaction:
+                    self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose level lives in a BucketStore row.
+
+    Refills use wall-clock time, since monotonic clocks can't be compared between
+    processes. Changes must be made inside the store's transaction().
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, store, key, rate_per_minute):
+        super().__init__(rate_per_minute)
+        self.store = store
+        self.key = key
+        with store.lock:
+            store.db.execute(
+                "INSERT OR IGNORE INTO buckets (key, level, updated) VALUES (?, ?, ?)",
+                (key, self.level, self.updated)
+            )
+
+    def _refill(self):
+        with self.store.lock:
+            self.level, self.updated = self.store.db.execute(
+                "SELECT level, updated FROM buckets WHERE key = ?", (self.key,)
+            ).fetchone()
+        super()._refill()
+
+    def _save(self):
+        self.store.db.execute(
+            "UPDATE buckets SET level = ?, updated = ? WHERE key = ?",
+            (self.level, self.updated, self.key)
+        )
+
+
+class AdmissionController:
+    def __init__(self, name, rpm=GEMINI_RPM, tpm=GEMINI_TPM, max_wait=ADMISSION_MAX_WAIT, store=None):
+        self.name = name
+        self.store = store
+        self.requests = self._bucket("requests", rpm) if rpm > 0 else None
+        self.tokens = self._bucket("tokens", tpm) if tpm > 0 else None
+        self.max_wait = max_wait
+        self.admitted = 0
+        self.rejected = 0
+        # Token corrections from settle() not yet written to a shared bucket
+        self.unsettled = 0
+        self.unsettled_lock = threading.Lock()
+
+    def _bucket(self, kind, rate_per_minute):
+        if self.store:
+            return SharedTokenBucket(self.store, f"{self.name}:{kind}", rate_per_minute)
+        return TokenBucket(rate_per_minute)
+
+    def _transaction(self):
+        return self.store.transaction() if self.store else nullcontext()
+
+    def _correct(self, difference):
+        if difference > 0:
+            self.tokens.give_back(difference)
+        elif difference < 0:
+            self.tokens.take(-difference)
+
+    def _reserve(self, estimated_tokens):
+        """(seconds to wait, whether the call was admitted) - takes the capacity if it was"""
+        with self._transaction():
+            if self.store and self.tokens:
+                with self.unsettled_lock:
+                    unsettled, self.unsettled = self.unsettled, 0
+                self._correct(unsettled)
+
+            wait = max(
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(estimated_tokens) if self.tokens else 0.0
+            )
+            if wait > self.max_wait:
+                return wait, False
+
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(estimated_tokens)
+            return wait, True
+
+    async def acquire(self, estimated_tokens):
+        """Reserve one request and estimated_tokens, waiting for capacity or raising RateLimited"""
+        if self.tokens:
+            # A single prompt larger than the whole minute's budget can never be admitted
+            estimated_tokens = min(estimated_tokens, self.tokens.capacity)
+
+        if self.store:
+            # Shared buckets may wait on another process's transaction - keep that off the event loop
+            wait, admitted = await asyncio.to_thread(self._reserve, estimated_tokens)
+        else:
+            wait, admitted = self._reserve(estimated_tokens)
+        if not admitted:
+            self.rejected += 1
+            raise RateLimited(
+                f"Gemini quota for {self.name} is saturated - try again in {math.ceil(wait)} seconds",
+                retry_after=wait
+            )
+
+        self.admitted += 1
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return estimated_tokens
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Correct the token reservation once Gemini reports the real usage"""
+        if not self.tokens or not actual_tokens:
+            return
+        difference = estimated_tokens - actual_tokens
+        if self.store:
+            # Written with the next reservation, so settling never waits on SQLite
+            with self.unsettled_lock:
+                self.unsettled += difference
+            return
+        self._correct(difference)
+
+    def get_stats(self):
+        """admitted/rejected count this process's calls; bucket levels are shared when the store is"""
+        return {
+            "model": self.name,
+            "shared": self.store is not None,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "requests_available": round(self.requests.available(), 1) if self.requests else None,
+            "tokens_available": round(self.tokens.available()) if self.tokens else None
+        }
+
+
+_controllers = {}
+_store = None
+
+
+def get_bucket_store():
+    """The shared bucket store, or None when RATE_LIMIT_DB is empty"""
+    global _store
+    if _store is None and RATE_LIMIT_DB:
+        _store = BucketStore(RATE_LIMIT_DB)
+    return _store
+
+
+def get_admission_controller(model_name):
+    """One controller per model - Gemini quotas are per model"""
+    controller = _controllers.get(model_name)
+    if controller is None:
+        controller = _controllers[model_name] = AdmissionController(model_name, store=get_bucket_store())
+    return controller
+
+
+def get_admission_stats():
+    return [controller.get_stats() for controller in _controllers.values()]
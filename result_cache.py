@@ -0,0 +1,211 @@
+"""
+Screening Result Cache - skip the PDF parse and Gemini call for repeat screenings
+Two tiers: an in-process LRU bounded by size, backed by a SQLite file with a TTL.
+The SQLite tier is shared by every worker process, so a result cached by one worker
+is a hit for all of them
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "screening_cache.db")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Remove expired rows from disk every this many writes
+PURGE_EVERY = 500
+
+
+def content_hash(pdf_content):
+    """SHA-256 of the raw upload bytes - spooled uploads carry the one computed while spooling"""
+    digest = getattr(pdf_content, "sha256", None)
+    return digest if digest is not None else hashlib.sha256(pdf_content).hexdigest()
+
+
+def normalize_requirements(job_requirements):
+    """Collapse whitespace and case so cosmetic edits still hit the cache"""
+    return " ".join((job_requirements or "").split()).lower()
+
+
+def make_cache_key(pdf_content, job_requirements, model_name, prompt_version):
+    """Cache key for one screening: the PDF, what it was screened against, and how"""
+    return make_hash_cache_key(content_hash(pdf_content), job_requirements, model_name, prompt_version)
+
+
+def make_hash_cache_key(pdf_hash, job_requirements, model_name, prompt_version):
+    """make_cache_key for a PDF known only by its content hash (e.g. a stored candidate)"""
+    key_parts = [
+        pdf_hash,
+        normalize_requirements(job_requirements),
+        model_name,
+        str(prompt_version)
+    ]
+    return hashlib.sha256("\x00".join(key_parts).encode("utf-8")).hexdigest()
+
+
+def is_cacheable(result):
+    """
+    Only keep real analyses - never errors, parse-failure placeholders, partial salvages
+    or borderline results whose escalation failed
+    """
+    return (
+        isinstance(result, dict)
+        and "error" not in result
+        and "raw_response" not in result
+        and "escalation_error" not in result
+        and not result.get("partial")
+    )
+
+
+class ResultCache:
+    """
+    get and set are coroutines: the memory tier is answered inline, the SQLite tier
+    runs in a worker thread. Disk errors (e.g. a lock held past busy_timeout by another
+    worker) are logged and treated as a miss or a skipped write - a result Gemini has
+    already been paid for is never lost to the cache.
+    """
+
+    def __init__(self, db_path=RESULT_CACHE_DB, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+
+        # Memory tier: key -> (expires_at, serialized result), oldest first
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            # Other worker processes write to the same file
+            self.db.execute("PRAGMA busy_timeout=5000")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self.db.commit()
+
+    # --- disk tier (blocking, called through asyncio.to_thread) ---
+
+    def _load(self, key, now):
+        with self.db_lock:
+            return self.db.execute(
+                "SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+
+    def _store(self, key, value, expires_at):
+        with self.db_lock:
+            try:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+                self.writes += 1
+                if self.writes % PURGE_EVERY == 0:
+                    self.db.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+                self.db.commit()
+            except sqlite3.Error:
+                if self.db.in_transaction:
+                    self.db.rollback()
+                raise
+
+    # --- async API ---
+
+    async def get(self, key):
+        """Return a copy of the cached result for key, or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and entry[0] > now:
+                self.memory.move_to_end(key)
+                self.hits_memory += 1
+                return json.loads(entry[1])
+            if entry:
+                self._evict(key)
+
+        row = None
+        if self.db is not None:
+            try:
+                row = await asyncio.to_thread(self._load, key, now)
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"⚠️  Result cache read failed: {e}")
+
+        with self.lock:
+            if row:
+                self._remember(key, row[0], row[1])
+                self.hits_disk += 1
+                return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    async def set(self, key, result):
+        """Store a screening result in both tiers"""
+        if not is_cacheable(result):
+            return
+        value = json.dumps(result)
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._remember(key, value, expires_at)
+        if self.db is not None:
+            try:
+                await asyncio.to_thread(self._store, key, value, expires_at)
+            except sqlite3.Error as e:
+                # Still served from the memory tier - only the other workers miss out
+                self.errors += 1
+                print(f"⚠️  Result cache write failed: {e}")
+
+    def _remember(self, key, value, expires_at):
+        """Add to the memory tier, evicting least recently used entries to stay under max_bytes"""
+        if key in self.memory:
+            self._evict(key)
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        self.memory[key] = (expires_at, value)
+        self.memory_bytes += size
+        while self.memory_bytes > self.max_bytes:
+            oldest = next(iter(self.memory))
+            self._evict(oldest)
+
+    def _evict(self, key):
+        _, value = self.memory.pop(key)
+        self.memory_bytes -= len(value)
+
+    def get_stats(self):
+        """Hit/miss counters and memory tier usage"""
+        with self.lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            hits = self.hits_memory + self.hits_disk
+            return {
+                "enabled": True,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "memory_max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "disk_errors": self.errors
+            }
@@ -0,0 +1,231 @@
+"""
+Result Parser - turn Gemini's reply into a validated screening result in one pass
+Well-formed replies are validated straight from the JSON text; malformed ones go
+through a targeted repair step that salvages whatever fields are recoverable, so a
+bad reply rarely means another paid round trip
+"""
+
+import json
+import re
+from typing import List
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from metrics import PARSE_OUTCOMES
+from prompts import clean_response_text
+
+
+class ScreeningResult(BaseModel):
+    score: int
+    summary: str = "Analysis completed"
+    strengths: List[str] = []
+    concerns: List[str] = []
+    match_percentage: int = 0
+
+    @field_validator("score", "match_percentage", mode="before")
+    @classmethod
+    def coerce_number(cls, value):
+        # Accept "8", "8/10", "75%" and 7.5 as well as plain integers
+        if isinstance(value, str):
+            number = re.search(r"-?\d+(\.\d+)?", value)
+            if not number:
+                raise ValueError("not a number")
+            value = number.group()
+        elif not isinstance(value, (int, float)):
+            # ValueError, not TypeError - pydantic only turns ValueErrors into a ValidationError
+            raise ValueError("not a number")
+        return int(round(float(value)))
+
+    @field_validator("score")
+    @classmethod
+    def clamp_score(cls, value):
+        return min(10, max(1, value))
+
+    @field_validator("match_percentage")
+    @classmethod
+    def clamp_percentage(cls, value):
+        return min(100, max(0, value))
+
+    @field_validator("strengths", "concerns", mode="before")
+    @classmethod
+    def coerce_list(cls, value):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [value]
+        if not isinstance(value, (list, tuple)):
+            raise ValueError("not a list")
+        return [str(item) for item in value]
+
+
+def _first_json_value(text, opening, closing):
+    """The first balanced {...} or [...] in text, ignoring brackets inside strings"""
+    start = text.find(opening)
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for position in range(start, len(text)):
+        char = text[position]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == opening:
+            depth += 1
+        elif char == closing:
+            depth -= 1
+            if depth == 0:
+                return text[start:position + 1]
+    # Truncated reply - close what was opened and let the loader have a go
+    return text[start:] + ('"' if in_string else "") + closing * depth
+
+
+def _loads_lenient(fragment):
+    """json.loads after fixing the usual LLM slips: trailing commas and smart quotes"""
+    fragment = fragment.replace("“", '"').replace("”", '"')
+    fragment = re.sub(r",\s*([}\]])", r"\1", fragment)
+    return json.loads(fragment)
+
+
+def _salvage_fields(text):
+    """Pull individual fields out of a reply that isn't valid JSON at all"""
+    fields = {}
+    for name in ("score", "match_percentage"):
+        match = re.search(rf'"?{name}"?\s*[:=]\s*"?(\d+(?:\.\d+)?)', text)
+        if match:
+            fields[name] = match.group(1)
+    summary = re.search(r'"summary"\s*:\s*"((?:[^"\\]|\\.)*)', text)
+    if summary:
+        fields["summary"] = summary.group(1)
+    for name in ("strengths", "concerns"):
+        block = re.search(rf'"{name}"\s*:\s*\[(.*?)(\]|$)', text, re.DOTALL)
+        if block:
+            fields[name] = re.findall(r'"((?:[^"\\]|\\.)*)"', block.group(1))
+    return fields
+
+
+# Fields that are complete in a partial (still streaming) reply: numbers followed by
+# a delimiter, closed strings and closed lists
+PARTIAL_NUMBER = re.compile(r'"(score|match_percentage)"\s*:\s*"?(-?\d+(?:\.\d+)?)%?"?\s*[,}\n]')
+PARTIAL_STRING = re.compile(r'"(summary)"\s*:\s*("(?:[^"\\]|\\.)*")')
+PARTIAL_LIST = re.compile(r'"(strengths|concerns)"\s*:\s*(\[(?:[^\]"]|"(?:[^"\\]|\\.)*")*\])')
+
+
+def parse_partial_fields(response_text):
+    """
+    The fields that can already be read from a reply that is still streaming in.
+
+    Only complete values are returned, validated like the final result, so a score of
+    "1" is never reported while "10" is still arriving. Returns {} when nothing is
+    readable yet.
+    """
+    fields = {}
+    for pattern in (PARTIAL_NUMBER, PARTIAL_STRING, PARTIAL_LIST):
+        for match in pattern.finditer(response_text):
+            try:
+                fields[match.group(1)] = json.loads(match.group(2))
+            except ValueError:
+                continue
+    if not fields:
+        return {}
+    try:
+        # score is required by the model - stand one in so the other fields validate alone
+        result = _validate({"score": 1, **fields})
+    except (TypeError, ValueError):
+        return {}
+    return {name: result[name] for name in fields}
+
+
+def _validate(data):
+    return ScreeningResult.model_validate(data).model_dump()
+
+
+def parse_screening_response(response_text):
+    """
+    Parse a single-candidate reply.
+
+    Returns the validated result dict. Outcomes (ok / repaired / failed) are counted
+    in metrics so parse-driven re-submissions stay visible.
+    """
+    try:
+        result = ScreeningResult.model_validate_json(response_text).model_dump()
+        PARSE_OUTCOMES.inc(outcome="ok")
+        return result
+    except (TypeError, ValueError):
+        # ValidationError is a ValueError
+        pass
+
+    # Repair: strip fences, take the first complete object, fix common slips
+    cleaned = clean_response_text(response_text)
+    fragment = _first_json_value(cleaned, "{", "}")
+    if fragment:
+        try:
+            result = _validate(_loads_lenient(fragment))
+            PARSE_OUTCOMES.inc(outcome="repaired")
+            return result
+        except (TypeError, ValueError):
+            pass
+
+    # Salvage whatever fields are readable - a score is the minimum worth keeping
+    fields = _salvage_fields(cleaned)
+    if "score" in fields:
+        try:
+            result = _validate(fields)
+            result["partial"] = True
+            PARSE_OUTCOMES.inc(outcome="repaired")
+            return result
+        except (TypeError, ValueError):
+            pass
+
+    PARSE_OUTCOMES.inc(outcome="failed")
+    return {
+        "score": 5,
+        "summary": "Analysis completed but format unclear. Check raw response.",
+        "strengths": ["See raw response"],
+        "concerns": ["JSON parsing failed"],
+        "match_percentage": 50,
+        "raw_response": response_text[:500],
+        "parse_error": True
+    }
+
+
+def parse_packed_response(response_text, count):
+    """
+    Map a packed reply back to candidates.
+
+    Returns {position: result} for every candidate (0-based) that came back with
+    a usable result. Missing or malformed entries are left out so the caller can
+    screen those candidates on their own.
+    """
+    try:
+        items = json.loads(response_text)
+    except ValueError:
+        fragment = _first_json_value(clean_response_text(response_text), "[", "]")
+        try:
+            items = _loads_lenient(fragment) if fragment else None
+        except ValueError:
+            items = None
+
+    if not isinstance(items, list):
+        PARSE_OUTCOMES.inc(outcome="failed")
+        return {}
+
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            position = int(item.pop("candidate")) - 1
+            if 0 <= position < count and "match_percentage" in item:
+                results[position] = _validate(item)
+        except (KeyError, TypeError, ValueError, ValidationError):
+            continue
+    PARSE_OUTCOMES.inc(outcome="ok" if len(results) == count else "repaired")
+    return results
@@ -0,0 +1,87 @@
+"""
+Tiered Model Routing - a cheap first pass for everyone, a stronger model for the close calls
+GEMINI_MODELS screens every resume. Only results whose score lands in the borderline
+band, or that could not be parsed cleanly, are screened again by ESCALATION_MODELS, and
+that answer stands. Clear matches and clear rejects never pay for the stronger model
+"""
+
+import os
+
+from gemini_client import configured_models
+from metrics import TIER_DECISIONS
+
+# Models for the second opinion, as "name[:timeout],..." like GEMINI_MODELS (empty = one tier)
+ESCALATION_MODELS = os.getenv("ESCALATION_MODELS", "")
+# First-pass scores (1-10, inclusive) that are re-screened by the escalation models
+ESCALATION_MIN_SCORE = int(os.getenv("ESCALATION_MIN_SCORE", "5"))
+ESCALATION_MAX_SCORE = int(os.getenv("ESCALATION_MAX_SCORE", "7"))
+
+
+class TierRouter:
+    """Decides which first-pass results are escalated, and counts how often"""
+
+    def __init__(self, spec=ESCALATION_MODELS, min_score=ESCALATION_MIN_SCORE, max_score=ESCALATION_MAX_SCORE):
+        self.spec = spec
+        self.models = [name for name, _ in configured_models(spec)]
+        self.min_score = min_score
+        self.max_score = max_score
+        self.first_pass = 0
+        self.escalated = 0
+        self.failed = 0
+        self.score_changes = 0
+        self.verdict_changes = 0
+
+    @property
+    def enabled(self):
+        return bool(self.models)
+
+    @property
+    def route_name(self):
+        """Part of the cache key - results routed differently must not be shared"""
+        return f">{self.models[0]}:{self.min_score}-{self.max_score}" if self.enabled else ""
+
+    def is_borderline(self, result):
+        """True for results in the band, and for repaired or unparseable replies"""
+        if result.get("parse_error") or result.get("partial"):
+            return True
+        return self.min_score <= result["score"] <= self.max_score
+
+    def kept(self, result):
+        """A first-pass result that stands"""
+        self.first_pass += 1
+        TIER_DECISIONS.inc(tier="first_pass")
+        return {**result, "tier": "first_pass"}
+
+    def escalation_failed(self, result, error):
+        """The first pass stands because the escalation call failed - not cached, so it is retried"""
+        self.failed += 1
+        TIER_DECISIONS.inc(tier="escalation_failed")
+        return {**result, "tier": "first_pass", "escalation_error": str(error)}
+
+    def overruled(self, first_pass, result):
+        """The escalation model's result, with the first-pass score it replaced"""
+        self.escalated += 1
+        TIER_DECISIONS.inc(tier="escalation")
+        self.score_changes += abs(result["score"] - first_pass["score"])
+        # Moving out of the band means the stronger model settled the call one way or the other
+        if not self.min_score <= result["score"] <= self.max_score:
+            self.verdict_changes += 1
+        return {
+            **result,
+            "tier": "escalation",
+            "first_pass": {"score": first_pass["score"], "match_percentage": first_pass["match_percentage"]}
+        }
+
+    def get_stats(self):
+        decided = self.first_pass + self.escalated + self.failed
+        return {
+            "enabled": self.enabled,
+            "escalation_models": self.models,
+            "borderline_scores": [self.min_score, self.max_score],
+            "first_pass": self.first_pass,
+            "escalated": self.escalated,
+            "escalation_failures": self.failed,
+            "escalation_rate": round((self.escalated + self.failed) / decided, 4) if decided else 0.0,
+            "mean_score_change": round(self.score_changes / self.escalated, 2) if self.escalated else 0.0,
+            "settled_by_escalation": self.verdict_changes
+        }
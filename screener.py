@@ -0,0 +1,512 @@
+"""
+Screening Pipeline - PDF bytes in, validated screening result out
+Owns the model pool, result cache and PDF extractor. The Gemini SDK is only imported,
+and the model pool only built, on first use (or by the app's background warm-up), so
+importing the app stays cheap and a fresh worker can start serving immediately.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+
+from compaction import Compactor
+from gemini_client import ModelPool, configured_models, generate, generate_stream
+from metrics import COMPRESSION_RATIO, NEAR_DUPLICATES, STAGE_LATENCY
+from near_duplicates import (
+    NEAR_DUPLICATE_ENABLED,
+    NEAR_DUPLICATE_THRESHOLD,
+    NearDuplicateIndex,
+    group_near_duplicates,
+    near_duplicate_result,
+    signature
+)
+from pdf_extractor import PdfExtractor
+from prefilter import shortlist, prefiltered_result
+from prompts import (
+    PROMPT_VERSION,
+    PACKED_PROMPT_VERSION,
+    SCREENING_GENERATION_CONFIG,
+    PACKED_GENERATION_CONFIG,
+    build_screening_prompt,
+    build_packed_prompt
+)
+from rate_limiter import RateLimited
+from routing import TierRouter
+from result_cache import (
+    ResultCache,
+    RESULT_CACHE_ENABLED,
+    content_hash,
+    is_cacheable,
+    make_cache_key,
+    make_hash_cache_key
+)
+from result_parser import parse_screening_response, parse_packed_response, parse_partial_fields
+
+# Seconds spent importing and configuring the Gemini SDK, filled in on first use
+SDK_PROFILE = {}
+
+MODEL_UNAVAILABLE = {
+    "error": "Model not initialized",
+    "message": "Please check /list-models to see available models",
+    "tip": "Check GEMINI_API_KEY and the model names in GEMINI_MODELS"
+}
+
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def load_genai():
+    """Import and configure google.generativeai on first use - it dominates import time"""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            start = time.perf_counter()
+            import google.generativeai as genai
+
+            # IMPORTANT: Create a .env file with GEMINI_API_KEY=your-actual-key
+            genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+            SDK_PROFILE["sdk_import_seconds"] = round(time.perf_counter() - start, 4)
+            _genai = genai
+    return _genai
+
+
+class Screener:
+    """
+    The screening pipeline shared by every endpoint and the job queue.
+
+    model is None until init_model has run; callers on the request path use
+    await get_model(), which initializes it off the event loop if needed.
+    """
+
+    def __init__(self, result_cache=None, pdf_extractor=None, candidate_store=None):
+        self.model = None
+        self.model_init_seconds = None
+        self.initialized = False
+        self.init_lock = threading.Lock()
+        # Cache of finished screenings, keyed on PDF content + requirements + model + prompt version
+        self.result_cache = result_cache if result_cache is not None else (
+            ResultCache() if RESULT_CACHE_ENABLED else None
+        )
+        # PDF parsing runs in a process pool so it never holds up the event loop
+        self.pdf_extractor = pdf_extractor or PdfExtractor()
+        # Picks the most useful sections of each resume to fit RESUME_TOKEN_BUDGET
+        self.compactor = Compactor()
+        # Extracted text of every resume seen, for re-screening without re-upload
+        self.candidate_store = candidate_store
+        # MinHash signatures of recently screened resumes, so near-duplicates in later
+        # batches are answered from the result cache
+        self.near_duplicates = NearDuplicateIndex() if NEAR_DUPLICATE_ENABLED else None
+        # Borderline first-pass results are re-screened by ESCALATION_MODELS
+        self.router = TierRouter()
+        self.escalation_model = None
+
+    def init_model(self):
+        """
+        Build the model pool - GEMINI_MODELS are tried in order, each with its own
+        timeout, retries and circuit breaker, so a degraded model is routed around
+        """
+        with self.init_lock:
+            if self.initialized:
+                return self.model
+            start = time.perf_counter()
+            genai = load_genai()
+            self.model = ModelPool.from_config(genai.GenerativeModel)
+            if self.router.enabled:
+                self.escalation_model = ModelPool.from_config(genai.GenerativeModel, self.router.spec)
+            self.model_init_seconds = round(time.perf_counter() - start, 4)
+            self.initialized = True
+            return self.model
+
+    async def get_model(self):
+        """The model pool, initialized in a worker thread on first use"""
+        if not self.initialized:
+            await asyncio.to_thread(self.init_model)
+        return self.model
+
+    @property
+    def model_name(self):
+        """Primary model name - known from GEMINI_MODELS before the pool is built"""
+        if self.model is not None:
+            return self.model.model_name
+        if self.initialized:
+            return "unknown"
+        names = configured_models()
+        return names[0][0] if names else "unknown"
+
+    @property
+    def cache_model(self):
+        """model_name plus the escalation route, for cache keys"""
+        return self.model_name + self.router.route_name
+
+    @property
+    def status(self):
+        if not self.initialized:
+            return "starting"
+        return "ready" if self.model else "error"
+
+    async def extract_resume(self, pdf_content, filename=None):
+        """
+        Extract resume text in the process pool, timed as the pdf_extraction stage.
+
+        With a candidate store, every resume seen is kept there under its content hash.
+        """
+        with STAGE_LATENCY.time(stage="pdf_extraction", model=self.model_name):
+            extraction = await self.pdf_extractor.extract(pdf_content)
+        if self.candidate_store:
+            await self.candidate_store.add(content_hash(pdf_content), filename, extraction)
+        return extraction
+
+    def compact(self, resume_text):
+        """Section-aware compaction of extracted text, timed as the compaction stage"""
+        with STAGE_LATENCY.time(stage="compaction", model=self.model_name):
+            compaction = self.compactor.compact(resume_text)
+        COMPRESSION_RATIO.observe(compaction["compression_ratio"])
+        return compaction["text"]
+
+    async def cached_result(self, cache_key):
+        return await self.result_cache.get(cache_key) if self.result_cache else None
+
+    async def remember_screening(self, pdf_hash, filename, resume_text, result):
+        """Index a freshly cached screening's signature for near-duplicate matching"""
+        if not self.near_duplicates or not self.result_cache or not is_cacheable(result):
+            return
+        if pdf_hash in self.near_duplicates:
+            return
+        resume_signature = await asyncio.to_thread(signature, resume_text)
+        self.near_duplicates.add(pdf_hash, resume_signature, filename)
+
+    async def screen_text(self, model, resume_text, job_requirements, cache_key):
+        """Compact, prompt, call Gemini and parse - the part shared by PDFs and stored candidates"""
+        resume_text = self.compact(resume_text)
+
+        # The magic prompt for Gemini
+        prompt = build_screening_prompt(resume_text, job_requirements)
+
+        # Generate response with Gemini - JSON mode constrained to SCREENING_SCHEMA
+        response = await generate(model, prompt, generation_config=SCREENING_GENERATION_CONFIG)
+        return await self.finish_reply(response.text, cache_key, prompt)
+
+    def parse_reply(self, reply_text):
+        # Repairs malformed output rather than asking again
+        with STAGE_LATENCY.time(stage="json_parse", model=self.model_name):
+            return parse_screening_response(reply_text)
+
+    async def cache_result(self, cache_key, result):
+        if self.result_cache:
+            await self.result_cache.set(cache_key, result)
+
+    async def escalate(self, prompt, result):
+        """
+        Tiered routing for a first-pass result: borderline ones are screened again with
+        the same prompt by the escalation models, whose answer stands. A failed
+        escalation leaves the first pass standing. Without ESCALATION_MODELS the
+        result is returned as it is.
+        """
+        if not self.router.enabled:
+            return result
+        if not self.router.is_borderline(result):
+            return self.router.kept(result)
+        if not self.escalation_model:
+            return self.router.escalation_failed(result, "Escalation models not initialized")
+        try:
+            response = await generate(self.escalation_model, prompt, generation_config=SCREENING_GENERATION_CONFIG)
+            escalated = self.parse_reply(response.text)
+        except Exception as e:
+            return self.router.escalation_failed(result, e)
+        if escalated.get("parse_error") and not result.get("parse_error"):
+            return self.router.escalation_failed(result, "Escalation reply could not be parsed")
+        return self.router.overruled(result, escalated)
+
+    async def finish_reply(self, reply_text, cache_key, prompt):
+        """Validate a complete reply in one pass, escalate it if borderline, and cache the result"""
+        result = await self.escalate(prompt, self.parse_reply(reply_text))
+        await self.cache_result(cache_key, result)
+        return result
+
+    async def screen_pdf(self, pdf_content, job_requirements: str = "", filename=None):
+        """Screen a single resume given its PDF - raw bytes or a spooled upload"""
+        model = await self.get_model()
+        if not model:
+            return dict(MODEL_UNAVAILABLE)
+
+        # Repeat screenings are answered from the cache without touching the API quota
+        cache_key = make_cache_key(pdf_content, job_requirements, self.cache_model, PROMPT_VERSION)
+        cached_result = await self.cached_result(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+        try:
+            # Extract text from PDF - stops once RESUME_CHAR_BUDGET is filled
+            extraction = await self.extract_resume(pdf_content, filename)
+            result = await self.screen_text(model, extraction["text"], job_requirements, cache_key)
+            await self.remember_screening(content_hash(pdf_content), filename, extraction["text"], result)
+            return result
+
+        except RateLimited:
+            # Handled by the app's rate limit handler - 429 with Retry-After
+            raise
+        except Exception as e:
+            return {
+                "error": str(e),
+                "tip": "Make sure the file is a valid PDF and try again"
+            }
+
+    async def stream_pdf(self, pdf_content, job_requirements: str = "", filename=None):
+        """
+        screen_pdf as a stream of (event, data) pairs, for server-sent events.
+
+        Events, in order:
+          extraction - pages parsed/skipped and characters, once the PDF is read
+          progress   - the stage now running, and characters received from Gemini so far
+          partial    - fields of the reply (score, summary, ...) as soon as each is complete
+          progress   - stage escalation with the first-pass score, when it is borderline
+          result     - the validated result, identical to what screen_pdf returns
+          error      - instead of result when screening fails
+
+        Cached results are sent straight away as the only event.
+        """
+        model = await self.get_model()
+        if not model:
+            yield "error", dict(MODEL_UNAVAILABLE)
+            return
+
+        cache_key = make_cache_key(pdf_content, job_requirements, self.cache_model, PROMPT_VERSION)
+        cached_result = await self.cached_result(cache_key)
+        if cached_result is not None:
+            yield "result", cached_result
+            return
+
+        try:
+            yield "progress", {"stage": "pdf_extraction"}
+            extraction = await self.extract_resume(pdf_content, filename)
+            yield "extraction", {
+                "pages_parsed": extraction.get("pages_parsed"),
+                "pages_skipped": extraction.get("pages_skipped"),
+                "characters": len(extraction["text"])
+            }
+
+            prompt = build_screening_prompt(self.compact(extraction["text"]), job_requirements)
+            yield "progress", {"stage": "llm_call", "model": self.model_name, "received_characters": 0}
+
+            reply = ""
+            sent = {}
+            async for text in generate_stream(model, prompt, generation_config=SCREENING_GENERATION_CONFIG):
+                reply += text
+                yield "progress", {"stage": "llm_call", "model": self.model_name, "received_characters": len(reply)}
+                fields = parse_partial_fields(reply)
+                new_fields = {name: value for name, value in fields.items() if sent.get(name) != value}
+                if new_fields:
+                    sent.update(new_fields)
+                    yield "partial", new_fields
+
+            result = self.parse_reply(reply)
+            if self.router.enabled and self.router.is_borderline(result):
+                yield "progress", {
+                    "stage": "escalation",
+                    "model": self.router.models[0],
+                    "first_pass": {"score": result["score"], "match_percentage": result["match_percentage"]}
+                }
+            result = await self.escalate(prompt, result)
+            await self.cache_result(cache_key, result)
+            await self.remember_screening(content_hash(pdf_content), filename, extraction["text"], result)
+            yield "result", result
+
+        except RateLimited as e:
+            # Headers are already sent, so a quota rejection becomes an error event
+            yield "error", {"error": str(e), "retry_after": e.retry_after}
+        except Exception as e:
+            yield "error", {
+                "error": str(e),
+                "tip": "Make sure the file is a valid PDF and try again"
+            }
+
+    async def screen_candidate(self, candidate, job_requirements: str = ""):
+        """
+        Screen a stored candidate (a dict from CandidateStore.get) - no upload or parse.
+
+        Stored candidates are keyed by their PDF's content hash, so results are shared
+        with the result cache entries of earlier uploads of the same file.
+        """
+        model = await self.get_model()
+        if not model:
+            return dict(MODEL_UNAVAILABLE)
+
+        cache_key = make_hash_cache_key(candidate["candidate_id"], job_requirements, self.cache_model, PROMPT_VERSION)
+        cached_result = await self.cached_result(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+        try:
+            result = await self.screen_text(model, candidate["text"], job_requirements, cache_key)
+            await self.remember_screening(candidate["candidate_id"], candidate.get("filename"), candidate["text"], result)
+            return result
+        except RateLimited:
+            raise
+        except Exception as e:
+            return {"error": str(e)}
+
+    async def screen_pdf_group(self, group, job_requirements: str = ""):
+        """
+        Screen several resumes with one packed prompt.
+
+        group is a list of (index, filename, pdf) with pdf as raw bytes or a spooled upload. The job requirements are sent
+        once for the whole group; any candidate missing from the packed reply (or whose
+        PDF couldn't be read) is screened on its own with screen_pdf.
+        """
+        model = await self.get_model()
+        results = {}
+        pending = []
+        for index, filename, pdf_content in group:
+            cache_key = make_cache_key(pdf_content, job_requirements, self.cache_model, PACKED_PROMPT_VERSION)
+            cached_result = await self.cached_result(cache_key)
+            if cached_result is not None:
+                results[index] = cached_result
+            else:
+                pending.append((index, filename, pdf_content, cache_key))
+
+        if pending and model:
+            extractions = await asyncio.gather(
+                *(self.extract_resume(pdf_content, filename) for _, filename, pdf_content, _ in pending),
+                return_exceptions=True
+            )
+            packable = [
+                (item, extraction["text"])
+                for item, extraction in zip(pending, extractions)
+                if not isinstance(extraction, Exception)
+            ]
+            if len(packable) > 1:
+                compacted = [self.compact(text) for _, text in packable]
+                try:
+                    prompt = build_packed_prompt(compacted, job_requirements)
+                    response = await generate(model, prompt, generation_config=PACKED_GENERATION_CONFIG)
+                    with STAGE_LATENCY.time(stage="json_parse", model=self.model_name):
+                        packed_results = parse_packed_response(response.text, len(packable))
+                except RateLimited:
+                    raise
+                except Exception:
+                    packed_results = {}
+                # Borderline candidates are escalated one by one, with a single-candidate prompt
+                positions = sorted(packed_results)
+                decided = await asyncio.gather(*(
+                    self.escalate(build_screening_prompt(compacted[position], job_requirements), packed_results[position])
+                    for position in positions
+                ))
+                for position, result in zip(positions, decided):
+                    (index, filename, pdf_content, cache_key), resume_text = packable[position]
+                    results[index] = result
+                    await self.cache_result(cache_key, result)
+                    await self.remember_screening(content_hash(pdf_content), filename, resume_text, result)
+
+        # Fall back to single-candidate calls for anything the packed call didn't cover
+        fallback = [(index, filename, pdf_content) for index, filename, pdf_content, _ in pending if index not in results]
+        single_results = await asyncio.gather(
+            *(self.screen_pdf(pdf_content, job_requirements, filename) for _, filename, pdf_content in fallback)
+        )
+        for (index, _, _), result in zip(fallback, single_results):
+            results[index] = result
+
+        return [
+            {"index": index, "filename": filename, "result": results[index]}
+            for index, filename, _ in group
+        ]
+
+    async def prefilter_uploads(self, uploads, job_requirements, top_k, min_score):
+        """
+        Rank uploads by keyword overlap with the job requirements.
+
+        Returns (shortlisted uploads, prefiltered result items). Extracted text is
+        cached, so shortlisted resumes aren't parsed a second time when screened.
+        """
+        extractions = await asyncio.gather(
+            *(self.extract_resume(pdf_content, filename) for _, filename, pdf_content in uploads),
+            return_exceptions=True
+        )
+        resume_texts = [
+            "" if isinstance(extraction, Exception) else extraction["text"]
+            for extraction in extractions
+        ]
+        scores, ranks, selected = shortlist(resume_texts, job_requirements, top_k, min_score)
+
+        shortlisted = []
+        skipped = []
+        for position, (index, filename, pdf_content) in enumerate(uploads):
+            # Unreadable PDFs still go through screening so they report their error
+            if selected[position] or isinstance(extractions[position], Exception):
+                shortlisted.append((index, filename, pdf_content))
+            else:
+                skipped.append({
+                    "index": index,
+                    "filename": filename,
+                    "result": prefiltered_result(scores[position], ranks[position])
+                })
+        return shortlisted, skipped
+
+    async def recent_duplicate(self, resume_signature, pdf_hash, job_requirements, prompt_version):
+        """
+        The cached result of a recently screened near-duplicate, as (pdf_hash, filename,
+        similarity, result), or None. The same PDF is left to the exact-match cache.
+        """
+        if not self.near_duplicates or not self.result_cache:
+            return None
+        for match_hash, filename, score in self.near_duplicates.query(resume_signature):
+            if match_hash == pdf_hash:
+                continue
+            cache_key = make_hash_cache_key(match_hash, job_requirements, self.cache_model, prompt_version)
+            result = await self.cached_result(cache_key)
+            if result is not None:
+                return match_hash, filename, score, result
+        return None
+
+    async def dedup_uploads(self, uploads, job_requirements, packed=False):
+        """
+        Collapse near-duplicate resumes in a batch so each is only screened once.
+
+        Returns (representatives, followers, reused): the uploads still to screen, a dict
+        from each representative's index to the uploads that share its result as
+        (index, filename, similarity), and result items for representatives answered
+        by a recently screened near-duplicate's cached result. Extracted text is cached,
+        so representatives aren't parsed a second time when screened.
+        """
+        extractions = await asyncio.gather(
+            *(self.extract_resume(pdf_content, filename) for _, filename, pdf_content in uploads),
+            return_exceptions=True
+        )
+        resume_texts = [
+            "" if isinstance(extraction, Exception) else extraction["text"]
+            for extraction in extractions
+        ]
+        signatures = await asyncio.to_thread(lambda: [signature(text) for text in resume_texts])
+        threshold = self.near_duplicates.threshold if self.near_duplicates else NEAR_DUPLICATE_THRESHOLD
+        groups = group_near_duplicates(signatures, threshold)
+
+        prompt_version = PACKED_PROMPT_VERSION if packed else PROMPT_VERSION
+        representatives = []
+        followers = defaultdict(list)
+        reused = []
+        for position, (index, filename, pdf_content) in enumerate(uploads):
+            if groups[position] is not None:
+                representative, score = groups[position]
+                followers[uploads[representative][0]].append((index, filename, round(score, 4)))
+                NEAR_DUPLICATES.inc(scope="batch")
+                continue
+            match = await self.recent_duplicate(
+                signatures[position], content_hash(pdf_content), job_requirements, prompt_version
+            )
+            if match is None:
+                representatives.append((index, filename, pdf_content))
+                continue
+            match_hash, match_filename, score, result = match
+            NEAR_DUPLICATES.inc(scope="recent")
+            reused.append({
+                "index": index,
+                "filename": filename,
+                "result": near_duplicate_result(
+                    result, candidate_id=match_hash, filename=match_filename, similarity=round(score, 4)
+                )
+            })
+        return representatives, dict(followers), reused
+
+    def shutdown(self):
+        self.pdf_extractor.shutdown()
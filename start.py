@@ -29,7 +29,13 @@ def main():
     print("=" * 50)
     
     uvicorn_path = os.path.join("venv", "Scripts", "uvicorn.exe") if os.name == 'nt' else os.path.join("venv", "bin", "uvicorn")
-    subprocess.run([uvicorn_path, "app:app", "--reload", "--host", "0.0.0.0", "--port", "8000"])
+    # WEB_CONCURRENCY=4 serves with 4 worker processes (auto-reload only works with one)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        print(f"⚙️  Running {workers} worker processes")
+        subprocess.run([uvicorn_path, "app:app", "--workers", str(workers), "--host", "0.0.0.0", "--port", "8000"])
+    else:
+        subprocess.run([uvicorn_path, "app:app", "--reload", "--host", "0.0.0.0", "--port", "8000"])
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,296 @@
+"""
+Upload Spooling - keep uploaded PDFs out of memory
+File parts are written to named temp files as the multipart body is parsed, hashed on
+the way, and parsed from a memory map in the extraction process, so no upload is ever
+held in memory as a whole or copied twice. Per-file and per-request size caps plus a
+per-worker cap on in-flight request bytes, reserved before the body is read, keep a
+burst of large scans from exhausting memory or disk
+"""
+
+import asyncio
+import hashlib
+import math
+import os
+import tempfile
+import time
+import weakref
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
+
+# Largest single PDF accepted, and largest request body (bytes)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_REQUEST_UPLOAD_BYTES = int(os.getenv("MAX_REQUEST_UPLOAD_BYTES", str(512 * 1024 * 1024)))
+# Upload bytes held by all in-flight requests of one worker; requests beyond it wait
+MAX_INFLIGHT_UPLOAD_BYTES = int(os.getenv("MAX_INFLIGHT_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+# Longest a request waits for in-flight upload capacity before it is turned away with a 503
+UPLOAD_MAX_WAIT = float(os.getenv("UPLOAD_MAX_WAIT", "10"))
+# Directory uploads are spooled to (empty = the system temp directory)
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+def _megabytes(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class UploadBudget:
+    """Request body bytes held by this worker's in-flight requests"""
+
+    def __init__(self, max_bytes=MAX_INFLIGHT_UPLOAD_BYTES, max_wait=UPLOAD_MAX_WAIT):
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.in_use = 0
+        self.peak = 0
+        self.rejected = 0
+        self.loop = None
+        self.released = asyncio.Event()
+
+    async def acquire(self, amount):
+        """Reserve amount bytes, waiting up to max_wait for other requests to finish"""
+        if amount > self.max_bytes:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload of {_megabytes(amount)} exceeds the server's limit of {_megabytes(self.max_bytes)}"
+            )
+        self.loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.max_wait
+        while self.in_use + amount > self.max_bytes:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many uploads in progress - try again shortly",
+                    headers={"Retry-After": str(max(1, math.ceil(self.max_wait)))}
+                )
+            self.released.clear()
+            try:
+                await asyncio.wait_for(self.released.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        self.in_use += amount
+        self.peak = max(self.peak, self.in_use)
+
+    def release(self, amount):
+        """Return bytes - safe to call from any thread"""
+        self.in_use -= amount
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.released.set)
+
+    def get_stats(self):
+        return {
+            "in_flight_bytes": self.in_use,
+            "peak_in_flight_bytes": self.peak,
+            "max_in_flight_bytes": self.max_bytes,
+            "rejected": self.rejected,
+            "max_file_bytes": MAX_UPLOAD_BYTES,
+            "max_request_bytes": MAX_REQUEST_UPLOAD_BYTES
+        }
+
+
+upload_budget = UploadBudget()
+
+
+class SpoolFile:
+    """
+    A multipart file part written straight to a named temp file, hashed as it arrives.
+
+    Stands in for the SpooledTemporaryFile Starlette would use, so the part is already
+    on disk where the extraction process can open it by path. Once detach()ed into a
+    PdfUpload, closing the form no longer deletes it.
+    """
+
+    def __init__(self):
+        self.temp_file = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", dir=UPLOAD_SPOOL_DIR)
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.temp_file.write(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET and offset == 0:
+            # Starlette rewinds a part once it is complete - flush it for readers by path
+            self.temp_file.flush()
+        return self.temp_file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self.temp_file.read(size)
+
+    def tell(self):
+        return self.temp_file.tell()
+
+    def detach(self):
+        temp_file, self.temp_file = self.temp_file, None
+        temp_file.flush()
+        return temp_file
+
+    def close(self):
+        if self.temp_file is not None:
+            self.temp_file.close()
+
+
+_on_headers_finished = MultiPartParser.on_headers_finished
+
+
+def _spool_file_parts(parser):
+    """MultiPartParser.on_headers_finished, with file parts going to a SpoolFile"""
+    _on_headers_finished(parser)
+    upload = parser._current_part.file
+    if upload is not None:
+        parser._files_to_close_on_error.remove(upload.file)
+        upload.file.close()
+        upload.file = SpoolFile()
+        parser._files_to_close_on_error.append(upload.file)
+
+
+# Starlette reads the whole form before the endpoint runs, by default into spooled temp
+# files without a name - write file parts to our own so the endpoint never copies them
+MultiPartParser.on_headers_finished = _spool_file_parts
+
+
+class PdfUpload:
+    """
+    An uploaded PDF spooled to a named temp file.
+
+    Used in place of the raw bytes throughout the pipeline: content_hash() picks up
+    the sha256 computed while spooling, and PdfExtractor parses the file by path in
+    its worker process. The temp file is deleted on close(), or when the upload is
+    garbage collected.
+    """
+
+    def __init__(self, filename, temp_file, size, sha256):
+        self.filename = filename
+        self.path = temp_file.name
+        self.size = size
+        self.sha256 = sha256
+        self._finalizer = weakref.finalize(self, temp_file.close)
+
+    def read(self):
+        """The whole file - only for storing it elsewhere (e.g. the job queue)"""
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self):
+        self._finalizer()
+
+
+def close_uploads(uploads):
+    for upload in uploads:
+        upload.close()
+
+
+def _spool(file, size):
+    """Take over an UploadFile's temp file - or copy it, if it wasn't spooled by SpoolFile"""
+    if isinstance(file.file, SpoolFile):
+        return PdfUpload(file.filename, file.file.detach(), size, file.file.digest.hexdigest())
+    temp_file = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", dir=UPLOAD_SPOOL_DIR)
+    digest = hashlib.sha256()
+    try:
+        file.file.seek(0)
+        while chunk := file.file.read(COPY_CHUNK_BYTES):
+            digest.update(chunk)
+            temp_file.write(chunk)
+        temp_file.flush()
+    except BaseException:
+        temp_file.close()
+        raise
+    return PdfUpload(file.filename, temp_file, size, digest.hexdigest())
+
+
+async def spool_uploads(files):
+    """
+    A PdfUpload per UploadFile, in upload order, enforcing the size caps.
+
+    The files were written to disk while the form was read; this takes them over so
+    they outlive the request (a streaming response may still be using them). Raises
+    HTTPException 413 when a file or the request is too large.
+    """
+    sizes = [file.size or 0 for file in files]
+    oversized = [
+        f"{file.filename} ({_megabytes(size)})"
+        for file, size in zip(files, sizes)
+        if size > MAX_UPLOAD_BYTES
+    ]
+    if oversized:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Files over the {_megabytes(MAX_UPLOAD_BYTES)} limit: {', '.join(oversized)}"
+        )
+    total = sum(sizes)
+    if total > MAX_REQUEST_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Upload of {_megabytes(total)} exceeds the {_megabytes(MAX_REQUEST_UPLOAD_BYTES)} request limit"
+        )
+
+    uploads = []
+    try:
+        for file, size in zip(files, sizes):
+            uploads.append(await asyncio.to_thread(_spool, file, size))
+    except BaseException:
+        close_uploads(uploads)
+        raise
+    return uploads
+
+
+class UploadLimitMiddleware:
+    """
+    Turn away request bodies over max_bytes with a 413, and hold each request's body
+    against the worker's upload budget from before its first byte is read until its
+    response has been sent - a request refused with a 503 hasn't stored anything
+    """
+
+    def __init__(self, app, max_bytes=MAX_REQUEST_UPLOAD_BYTES, budget=upload_budget):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.budget = budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds the {_megabytes(self.max_bytes)} limit"
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        declared = int(declared) if declared.isdigit() else 0
+        if self.max_bytes and declared > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        reserved = 0
+        if declared:
+            try:
+                await self.budget.acquire(declared)
+            except HTTPException as e:
+                await JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)(
+                    scope, receive, send
+                )
+                return
+            reserved = declared
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received, reserved
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                # FastAPI re-raises HTTPExceptions from body parsing as they are
+                if self.max_bytes and received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+                if received > reserved:
+                    # No Content-Length (chunked) - reserve as the body arrives
+                    await self.budget.acquire(received - reserved)
+                    reserved = received
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            if reserved:
+                self.budget.release(reserved)
@@ -1,125 +1,274 @@
 """
 API Usage Monitor - Track your Gemini API usage and costs
 Run this alongside your API to monitor usage and prevent surprises
+
+Requests are appended to a SQLite (WAL) event log in batches from a background
+thread, so tracking never rewrites a file on the request path and is safe to share
+between threads, uvicorn workers and the CLI summary below. Writes go through their own
+connection and lock, so a flush waiting on another worker's write lock never holds up
+track_request.
 """
 
+import atexit
 import json
 import os
+import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from collections import defaultdict
+
+# Free tier: 1,500 requests/day
+FREE_TIER_DAILY_REQUESTS = 1500
+# Seconds between background flushes, and pending events that force an early flush
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "1.0"))
+USAGE_FLUSH_BATCH = int(os.getenv("USAGE_FLUSH_BATCH", "100"))
+# Raw events older than this are compacted away (daily totals are kept forever)
+USAGE_EVENT_RETENTION_DAYS = int(os.getenv("USAGE_EVENT_RETENTION_DAYS", "30"))
+
+
+def request_cost(tokens_in, tokens_out, daily_count):
+    """Cost of one request given how many requests were made today (Gemini 1.5 Flash pricing)"""
+    if daily_count <= FREE_TIER_DAILY_REQUESTS:
+        return 0
+    # Paid tier pricing
+    cost_in = (tokens_in / 1_000_000) * 0.075
+    cost_out = (tokens_out / 1_000_000) * 0.30
+    return cost_in + cost_out
+
 
 class UsageMonitor:
-    def __init__(self, usage_file="api_usage.json"):
+    def __init__(self, usage_file="api_usage.db", legacy_file="api_usage.json"):
         self.usage_file = usage_file
-        self.load_usage()
-        
-    def load_usage(self):
-        """Load usage data from file"""
-        if os.path.exists(self.usage_file):
-            with open(self.usage_file, 'r') as f:
-                self.usage = json.load(f)
-        else:
-            self.usage = {
-                "daily": defaultdict(int),
-                "monthly": defaultdict(int),
-                "total_requests": 0,
-                "total_cost": 0.0
-            }
-    
-    def save_usage(self):
-        """Save usage data to file"""
-        # Convert defaultdict to regular dict for JSON
-        usage_data = {
-            "daily": dict(self.usage["daily"]),
-            "monthly": dict(self.usage["monthly"]),
-            "total_requests": self.usage["total_requests"],
-            "total_cost": self.usage["total_cost"]
-        }
-        with open(self.usage_file, 'w') as f:
-            json.dump(usage_data, f, indent=2)
-    
+        # Guards pending events, the flushed counters and the read connection
+        self.lock = threading.Lock()
+        # Guards the write connection
+        self.db_lock = threading.Lock()
+        self.pending = []
+        # Events taken by a flush that hasn't committed yet - still counted as pending
+        self.flushing = []
+        # Today's request count as of the last flush (all processes)
+        self.flushed_day = None
+        self.flushed_count = 0
+
+        self.db = sqlite3.connect(usage_file, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA busy_timeout=5000")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS usage_events (
+                ts REAL NOT NULL,
+                day TEXT NOT NULL,
+                tokens_in INTEGER NOT NULL,
+                tokens_out INTEGER NOT NULL,
+                cost REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS usage_events_ts ON usage_events (ts);
+            CREATE TABLE IF NOT EXISTS usage_daily (
+                day TEXT PRIMARY KEY,
+                requests INTEGER NOT NULL DEFAULT 0,
+                tokens_in INTEGER NOT NULL DEFAULT 0,
+                tokens_out INTEGER NOT NULL DEFAULT 0,
+                cost REAL NOT NULL DEFAULT 0
+            );
+            """
+        )
+        self.import_legacy_usage(legacy_file)
+        # WAL readers aren't blocked by a writer, so counts can be read while a flush waits
+        self.reader = sqlite3.connect(usage_file, check_same_thread=False, isolation_level=None)
+
+        self.flush_event = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, name="usage-flush", daemon=True)
+        self.flusher.start()
+        atexit.register(self.flush)
+
+    def import_legacy_usage(self, legacy_file):
+        """One-time import of daily counts from the old api_usage.json format"""
+        if not legacy_file or not os.path.exists(legacy_file):
+            return
+        if self.db.execute("SELECT COUNT(*) FROM usage_daily").fetchone()[0]:
+            return
+        with open(legacy_file, 'r') as f:
+            legacy = json.load(f)
+        self.db.executemany(
+            "INSERT OR IGNORE INTO usage_daily (day, requests) VALUES (?, ?)",
+            list(legacy.get("daily", {}).items())
+        )
+
     def track_request(self, tokens_in=2000, tokens_out=1000):
         """Track a single API request"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        month = datetime.now().strftime("%Y-%m")
-        
-        # Update counters
-        self.usage["daily"][today] = self.usage["daily"].get(today, 0) + 1
-        self.usage["monthly"][month] = self.usage["monthly"].get(month, 0) + 1
-        self.usage["total_requests"] += 1
-        
-        # Calculate cost (Gemini 1.5 Flash pricing)
-        # Free tier: 1,500 requests/day
-        daily_count = self.usage["daily"][today]
-        if daily_count > 1500:
-            # Paid tier pricing
-            cost_in = (tokens_in / 1_000_000) * 0.075
-            cost_out = (tokens_out / 1_000_000) * 0.30
-            request_cost = cost_in + cost_out
-            self.usage["total_cost"] += request_cost
-        else:
-            request_cost = 0
-        
-        self.save_usage()
-        return daily_count, request_cost
-    
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+
+        with self.lock:
+            base = self.flushed_count if self.flushed_day == today else self._load_daily_count(today)
+            daily_count = base + sum(1 for event in self.flushing + self.pending if event[1] == today) + 1
+            self.pending.append((time.time(), today, tokens_in, tokens_out))
+            should_flush = len(self.pending) >= USAGE_FLUSH_BATCH
+
+        if should_flush:
+            self.flush_event.set()
+        return daily_count, request_cost(tokens_in, tokens_out, daily_count)
+
+    def _load_daily_count(self, day):
+        row = self.reader.execute("SELECT requests FROM usage_daily WHERE day = ?", (day,)).fetchone()
+        self.flushed_day = day
+        self.flushed_count = row[0] if row else 0
+        return self.flushed_count
+
+    def _flush_loop(self):
+        last_compaction = 0
+        while True:
+            self.flush_event.wait(USAGE_FLUSH_INTERVAL)
+            self.flush_event.clear()
+            try:
+                self.flush()
+                if time.time() - last_compaction > 3600:
+                    self.compact()
+                    last_compaction = time.time()
+            except sqlite3.Error as e:
+                print(f"⚠️  Usage flush failed: {e}")
+
+    def flush(self):
+        """Write pending events in one transaction and update the daily totals"""
+        with self.db_lock:
+            with self.lock:
+                events, self.pending = self.pending, []
+                self.flushing = events
+            if not events:
+                return
+            try:
+                counts = self._write(events)
+            except BaseException:
+                with self.lock:
+                    # Keep the events for the next attempt
+                    self.pending = events + self.pending
+                    self.flushing = []
+                raise
+            with self.lock:
+                self.flushing = []
+                last_day = events[-1][1]
+                self.flushed_day = last_day
+                self.flushed_count = counts[last_day]
+
+    def _write(self, events):
+        """One transaction for a batch of events - returns each day's request count after it"""
+        # IMMEDIATE takes the write lock up front, so counts stay exact across processes
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            counts = {}
+            rows = []
+            for ts, day, tokens_in, tokens_out in events:
+                if day not in counts:
+                    row = self.db.execute(
+                        "SELECT requests FROM usage_daily WHERE day = ?", (day,)
+                    ).fetchone()
+                    counts[day] = row[0] if row else 0
+                counts[day] += 1
+                rows.append((ts, day, tokens_in, tokens_out, request_cost(tokens_in, tokens_out, counts[day])))
+            self.db.executemany(
+                "INSERT INTO usage_events (ts, day, tokens_in, tokens_out, cost) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.db.executemany(
+                "INSERT INTO usage_daily (day, requests, tokens_in, tokens_out, cost) VALUES (?, 1, ?, ?, ?)"
+                " ON CONFLICT(day) DO UPDATE SET requests = requests + 1,"
+                " tokens_in = tokens_in + excluded.tokens_in,"
+                " tokens_out = tokens_out + excluded.tokens_out,"
+                " cost = cost + excluded.cost",
+                [(day, tokens_in, tokens_out, cost) for _, day, tokens_in, tokens_out, cost in rows]
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            # A failed COMMIT can leave the transaction open; other errors may have ended it
+            if self.db.in_transaction:
+                self.db.execute("ROLLBACK")
+            raise
+        return counts
+
+    def compact(self):
+        """Drop raw events past the retention window - daily totals already include them"""
+        cutoff = time.time() - USAGE_EVENT_RETENTION_DAYS * 86400
+        with self.db_lock:
+            self.db.execute("DELETE FROM usage_events WHERE ts < ?", (cutoff,))
+
     def get_daily_stats(self):
         """Get today's usage statistics"""
+        self.flush()
         today = datetime.now().strftime("%Y-%m-%d")
-        daily_count = self.usage["daily"].get(today, 0)
-        free_remaining = max(0, 1500 - daily_count)
-        
+        with self.lock:
+            daily_count = self._load_daily_count(today)
+        free_remaining = max(0, FREE_TIER_DAILY_REQUESTS - daily_count)
+
         return {
             "date": today,
             "requests": daily_count,
             "free_remaining": free_remaining,
-            "is_paid_tier": daily_count > 1500
+            "is_paid_tier": daily_count > FREE_TIER_DAILY_REQUESTS
         }
-    
+
     def get_monthly_stats(self):
         """Get this month's usage statistics"""
-        month = datetime.now().strftime("%Y-%m")
-        monthly_count = self.usage["monthly"].get(month, 0)
-        
+        self.flush()
+        now = datetime.now()
+        month = now.strftime("%Y-%m")
+        month_start = now.replace(day=1)
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        with self.lock:
+            monthly_count = self.reader.execute(
+                "SELECT COALESCE(SUM(requests), 0) FROM usage_daily WHERE day >= ? AND day < ?",
+                (month_start.strftime("%Y-%m-%d"), next_month.strftime("%Y-%m-%d"))
+            ).fetchone()[0]
+
         # Estimate monthly cost
-        avg_daily = monthly_count / datetime.now().day
+        avg_daily = monthly_count / now.day
         projected_monthly = avg_daily * 30
-        
+
         # Calculate costs (assuming average distribution)
-        free_requests = min(projected_monthly, 1500 * 30)
+        free_requests = min(projected_monthly, FREE_TIER_DAILY_REQUESTS * 30)
         paid_requests = max(0, projected_monthly - free_requests)
         estimated_cost = paid_requests * 0.00045  # Average cost per resume
-        
+
         return {
             "month": month,
             "requests": monthly_count,
             "projected_total": int(projected_monthly),
             "estimated_cost": estimated_cost
         }
-    
+
+    def get_totals(self):
+        """All-time request count and cost"""
+        self.flush()
+        with self.lock:
+            total_requests, total_cost = self.reader.execute(
+                "SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(cost), 0) FROM usage_daily"
+            ).fetchone()
+        return {"total_requests": total_requests, "total_cost": total_cost}
+
     def print_summary(self):
         """Print usage summary"""
         daily = self.get_daily_stats()
         monthly = self.get_monthly_stats()
-        
+        totals = self.get_totals()
+
         print("\n📊 API USAGE SUMMARY")
         print("=" * 50)
-        
+
         print(f"\n📅 Today ({daily['date']}):")
         print(f"   Requests: {daily['requests']:,}")
         print(f"   Free remaining: {daily['free_remaining']:,}")
         if daily['is_paid_tier']:
             print("   ⚠️  NOW USING PAID TIER")
-        
+
         print(f"\n📆 This Month ({monthly['month']}):")
         print(f"   Requests: {monthly['requests']:,}")
         print(f"   Projected total: {monthly['projected_total']:,}")
         print(f"   Estimated cost: ${monthly['estimated_cost']:.2f}")
-        
+
         print(f"\n💰 All-time:")
-        print(f"   Total requests: {self.usage['total_requests']:,}")
-        print(f"   Total cost: ${self.usage['total_cost']:.2f}")
-        
+        print(f"   Total requests: {totals['total_requests']:,}")
+        print(f"   Total cost: ${totals['total_cost']:.2f}")
+
         print("\n💡 Tips:")
         if daily['free_remaining'] < 100:
             print("   ⚠️  Low on free tier requests today!")